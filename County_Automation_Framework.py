@@ -13,7 +13,9 @@
 
 import arcpy
 import os
-import datetime
+import time
+import atexit
+import logging
 
 # -------------------------------------------------------------------------
 # 1. SETUP & CONFIGURATION
@@ -40,15 +42,39 @@ tasks = {
 arcpy.env.workspace = workspace
 arcpy.env.overwriteOutput = True
 
+# VERBOSITY: Detail lines (repair/validation/buffer steps) always go to the QC log file,
+# but are only echoed to the console when this is lowered to logging.DEBUG. Keep INFO for production runs.
+LOG_LEVEL = logging.INFO
+logger = logging.getLogger("County_Automation_Framework")
+logger.setLevel(LOG_LEVEL)
+
+# LOG FILE HANDLE:
+# Opened once for the whole run instead of once per message. Writes are buffered
+# and only pushed to disk at checkpoints (end of each layer, failures, shutdown).
+LOG_FH = open(log_file, "a", buffering=1 << 16)
+atexit.register(LOG_FH.close)
+
+# TIMESTAMP CACHE: [epoch second, "HH:MM:SS" string]
+# Messages logged within the same second reuse the string instead of re-formatting it.
+_last_sec = [0, ""]
+
 # LOGGING FUNCTION:
 # This creates a "Human-Readable" history of the script's actions.
 # Essential for troubleshooting and providing QC reports to supervisors.
-def record_progress(message):
-    timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+def record_progress(message, echo=True):
+    s = int(time.time())
+    if s != _last_sec[0]:
+        _last_sec[0] = s
+        _last_sec[1] = time.strftime("%H:%M:%S", time.localtime(s))
+    timestamp = _last_sec[1]
     formatted_msg = f"[{timestamp}] {message}"
-    print(formatted_msg)
-    with open(log_file, "a") as f:
-        f.write(formatted_msg + "\n")
+    if echo:
+        print(formatted_msg)
+    LOG_FH.write(formatted_msg + "\n")
+
+# DETAIL LOGGING: Always kept in the QC log; the level check only decides whether the console sees it.
+def record_detail(message, *args):
+    record_progress(message % args, echo=logger.isEnabledFor(logging.DEBUG))
 
 # -------------------------------------------------------------------------
 # 2. THE MAIN PROCESSING ENGINE
@@ -64,11 +90,12 @@ try:
         # This prevents the script from crashing if a file was accidentally deleted.
         if not arcpy.Exists(layer_name):
             record_progress(f"⚠️ SKIPPING {layer_name}: File not found in the database.")
+            LOG_FH.flush()
             continue
 
         # GEOMETRY QC: Repair any "dirty" geometry (like self-intersections).
         # Counties often deal with legacy data; this ensures the shapes are "healthy."
-        record_progress(f"Running Repair Geometry on {layer_name}...")
+        record_detail("Running Repair Geometry on %s...", layer_name)
         arcpy.management.RepairGeometry(layer_name)
 
         # PROJECTION CHECK: Ensuring the data aligns with County Standards.
@@ -79,17 +106,17 @@ try:
             # We use "memory/" to keep the hard drive clean of temporary files.
             working_layer = arcpy.management.Project(layer_name, "memory/temp_layer", county_standard)
         else:
-            record_progress(f"SPATIAL VALIDATION: {layer_name} already matches standards.")
+            record_detail("SPATIAL VALIDATION: %s already matches standards.", layer_name)
             working_layer = layer_name
 
         # ATTRIBUTE FILTERING: Example of a conditional analysis.
         # Here, we only want to buffer Elementary Schools for a specific safety study.
         if layer_name == "Schools":
-            record_progress("Applying attribute filter for 'Elementary' schools...")
+            record_detail("Applying attribute filter for 'Elementary' schools...")
             working_layer = arcpy.management.SelectLayerByAttribute(working_layer, "NEW_SELECTION", "TYPE = 'Elementary'")
 
         # ANALYSIS & TOPOLOGY: Creating the actual Safety Buffers.
-        record_progress(f"Creating a {distance} dissolved buffer for {layer_name}...")
+        record_detail("Creating a %s dissolved buffer for %s...", distance, layer_name)
         output_path = os.path.join(workspace, f"{layer_name}_Final_Buffer")
         
         
@@ -106,6 +133,7 @@ try:
         # FINAL VERIFICATION: Get the count of the results to confirm success.
         final_count = arcpy.management.GetCount(output_path)
         record_progress(f"✅ SUCCESS: {layer_name} processed. {final_count} zones created.")
+        LOG_FH.flush()  # Checkpoint: make this layer's progress visible on disk
 
     record_progress("--- Workflow Complete: Data is validated and ready for use ---")
 
@@ -113,8 +141,10 @@ except Exception as e:
     # CATCH-ALL ERROR HANDLING: If the script fails, it logs the exact Python error.
     # This prevents the window from just "disappearing" without an explanation.
     record_progress(f"❌ CRITICAL FAILURE: {str(e)}")
+    LOG_FH.flush()
 
 finally:
     # Cleanup: Delete the temporary memory layer to free up system RAM.
     if arcpy.Exists("memory/temp_layer"):
-        arcpy.management.Delete("memory/temp_layer")
\ No newline at end of file
+        arcpy.management.Delete("memory/temp_layer")
+    LOG_FH.flush()
\ No newline at end of file
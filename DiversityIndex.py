@@ -1,169 +1,202 @@
 import arcpy
 import os 
+import sys
+import logging
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
 arcpy.env.overwriteOutput = True
 
+#logging setup. change to logging.DEBUG to see the detailed field checks
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger("DiversityIndex")
+
 #setting up the paths and gdb
 inputTract= r"C:\ArcPyProjects\DiversityIndex\inputs\dm10\NCTracts2010.shp"
 output_folder = r"C:\ArcPyProjects\DiversityIndex\outputs"
 gdb_name = "DiversityIndex.gdb"
 outgdb = os.path.join(output_folder,gdb_name)
-chosenCounty = "Orange"
-outPath= os.path.join(outgdb, f"{chosenCounty}_DI_2010")
-
-#here i am galncing at the fields in the input data to see what i need and what I have
 
-fieldsNameTract = [f.name for f in arcpy.ListFields(inputTract)]
-print(f"Fields in the input data: {fieldsNameTract}") 
-if not arcpy.Exists(outgdb):
-    arcpy.management.CreateFileGDB(output_folder, gdb_name)
-else:
-    print(f"GDB already exist:{outgdb}")
-
-#Here i am creating a fms to only keep the fields i need for when i do conversion export feature i can filter out the unneeded fields
+#counties to run and their CNTY_FIPS code in the tract data. add more counties here to run them side by side
+COUNTIES = {
+    "Orange": "135",
+}
 
-if not arcpy.Exists(outPath):
-    FieldsToKeep = ['POP2010','WHITE', 'BLACK', 'AMERI_ES', 'ASIAN', 'HAWN_PI', 'HISPANIC', 'OTHER','CNTY_FIPS' ]
-    fms = arcpy.FieldMappings() # creating container for all the collumns 
-    fms.addTable(inputTract)
 
-    for field in fms.fields: #this is the first safty net creates a static list of the table so doesent shift wheen we delete fields
-        if field.name not in FieldsToKeep and not field.required:
-            fms.removeFieldMap(fms.findFieldMapIndex(field.name)) #the second safty net is here. THis makes it a live list to even when things move aorund as it is being deletd this will accurately find the index of the field.name
+#everything for one county lives in this function so the script can be imported (and run in worker processes) without running it
+def run_diversity_index(chosenCounty, countyFips, inputTract, outgdb):
+    outPath= os.path.join(outgdb, f"{chosenCounty}_DI_2010")
 
+    #Here i am creating a fms to only keep the fields i need for when i do conversion export feature i can filter out the unneeded fields
 
-    arcpy.conversion.ExportFeatures( #exporting it to make a new feature class with only the fields i want
+    if not arcpy.Exists(outPath):
+        FieldsToKeep = ['POP2010','WHITE', 'BLACK', 'AMERI_ES', 'ASIAN', 'HAWN_PI', 'HISPANIC', 'OTHER','CNTY_FIPS' ]
+        fms = arcpy.FieldMappings() # creating container for only the collumns i keep
 
-        in_features=inputTract,
-        out_features=outPath,
-        where_clause="CNTY_FIPS = '135'",
-        field_mapping=fms
-    )
-    print(f"Feature class created:{outPath}")
-else:
-    print(f"Feature class already exist:{outPath}")
+        #building a field map just for each kept field instead of mapping the whole table and removing the rest one by one
+        #(required fields like the OID and shape are always carried over by the export)
+        for fieldName in FieldsToKeep:
+            fm = arcpy.FieldMap()
+            fm.addInputField(inputTract, fieldName)
+            fms.addFieldMap(fm)
 
-listFields_outPathCleaned = [f.name for f in arcpy.ListFields(outPath)]
-print(f"Fields in outPath before adding new fields: {listFields_outPathCleaned}")
 
-newfields = ["div_index","per_Nhisp"]  #fields i need to add for the diversity index calculation
+        arcpy.conversion.ExportFeatures( #exporting it to make a new feature class with only the fields i want
 
-for nf in newfields:
-    if nf not in listFields_outPathCleaned:
-        arcpy.management.AddField(outPath,nf, "DOUBLE")
+            in_features=inputTract,
+            out_features=outPath,
+            where_clause=f"CNTY_FIPS = '{countyFips}'",
+            field_mapping=fms
+        )
+        print(f"Feature class created:{outPath}")
     else:
-        print("All fields already exist")
-
-#NOW that all fields are cleaned and ready I will now create the blueprint for the cursor 
-
+        print(f"Feature class already exist:{outPath}")
 
-#but first i have to make a fieldmap to rename the fields to easier names to use later
+    listFields_outPathCleaned = [f.name for f in arcpy.ListFields(outPath)]
+    print(f"Fields in outPath before adding new fields: {listFields_outPathCleaned}")
+    existingFields = set(listFields_outPathCleaned) #one ListFields call, reused as a set for all the checks below
 
-field_map ={
-    "pop":"POP2010",
-    "white":"WHITE",
-    "black":"BLACK",
-    "ameri":"AMERI_ES",
-    "asian":"ASIAN",
-    "hawnpi":"HAWN_PI",
-    "hisp":"HISPANIC",
-    "other":"OTHER",
-}
+    newfields = ["div_index","per_Nhisp"]  #fields i need to add for the diversity index calculation
 
-#making sure the values exist in the cleaned field list. have to loop thorugh keya nd val becuase fieldmap  items returns a pair.
-for key, val in field_map.items():
-    if val not in listFields_outPathCleaned:
-        raise ValueError(f"Error: the key {key} for {val} not found in the fields")
+    fieldsToAdd = [[nf, "DOUBLE"] for nf in newfields if nf not in existingFields]
+    if fieldsToAdd:
+        arcpy.management.AddFields(outPath, fieldsToAdd) #one schema change for all the missing fields instead of one AddField each
     else:
-        print(f"Key and value pairs found: {key} -> {val}")
-
-
-#this is the order of the fields in the curso and I need this because it is the blueprint for the diversity index formular. I need it to be in correct order
-cursorfields = [
-    field_map["pop"],        #0
-    field_map["white"],      #1
-    field_map["black"],      #2
-    field_map["ameri"],      #3
-    field_map["asian"],      #4
-    field_map["hawnpi"],     #5
-    field_map["hisp"],       #6
-    field_map["other"],      #7
-    "div_index",             #8
-    "per_Nhisp"              #9
-
-]
-
-
-with arcpy.da.UpdateCursor(outPath, cursorfields) as cursor: #creating the main math engine that will calculate Diversity Index
-    for row in cursor:
-        pop = row[0] if row[0] and row[0]>0 else 0
-        if pop > 0:
-            allracesquaresum = sum([((row[i])/100)**2 for i in range(1,)])
-            perHisp = (row[6] or 0)/pop
-            perNhisp = 1- perHisp
-            hisp_nhips_squared = perHisp**2 + perNhisp**2
-            row[8] = 1 - (allracesquaresum * hisp_nhips_squared)
-            row[9] = perNhisp
-        else:
-            row[8]= 0
-            row[9]= 0
-        cursor.updateRow(row)
-
-#This is another way to set up the conditions of the loop for the cursor.
-# with arcpy.da.UpdateCursor(outPath, cursorfields) as cursor:
-#     for row in cursor:
-#         if row[0] and row[0]>0:
-#             pop = row[0]
-#             sum_race_squared = sum([((row[i])/pop)**2 for i in range(1,7)])
-#             perHisp = (row[6] or 0)/pop
-#             per_Nhisp = 1 - perHisp
-#             his_nhisp_squared = perHisp**2 + per_Nhisp**2
-#             row[8] = 1 - (sum_race_squared * his_nhisp_squared)
-#             row[9] = per_Nhisp
-
-
-
-            
-#         else:# if pop is 0 or null ill preset these values for it
-#             row[8]= 0
-#             row[9]= 0
-#         cursor.updateRow(row)
-
-
-with arcpy.da.UpdateCursor(outPath, ["div_index"]) as cursor:#this is to fix any outliers.
-        if row[0] >= .9999:
-            row[0]= 0
-            cursor.updateRow(row)
-
-print(f"Diversity Index calculation completed. Results saved in: {outPath}")
-
-
-
-
-
-    
-   
-
-
-           
-   
-
-
-
-
-
-
-
-
+        print("All fields already exist")
 
+    #NOW that all fields are cleaned and ready I will now create the blueprint for the cursor 
+
+
+    #but first i have to make a fieldmap to rename the fields to easier names to use later
+
+    field_map ={
+        "pop":"POP2010",
+        "white":"WHITE",
+        "black":"BLACK",
+        "ameri":"AMERI_ES",
+        "asian":"ASIAN",
+        "hawnpi":"HAWN_PI",
+        "hisp":"HISPANIC",
+        "other":"OTHER",
+    }
+
+    #making sure the values exist in the cleaned field list. have to loop thorugh keya nd val becuase fieldmap  items returns a pair.
+    for key, val in field_map.items():
+        if val not in existingFields:
+            raise ValueError(f"Error: the key {key} for {val} not found in the fields")
+        elif logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Key and value pairs found: %s -> %s", key, val)
+
+
+    #this is the order of the fields in the curso and I need this because it is the blueprint for the diversity index formular. I need it to be in correct order
+    cursorfields = [
+        field_map["pop"],        #0
+        field_map["white"],      #1
+        field_map["black"],      #2
+        field_map["ameri"],      #3
+        field_map["asian"],      #4
+        field_map["hawnpi"],     #5
+        field_map["hisp"],       #6
+        field_map["other"],      #7
+        "div_index",             #8
+        "per_Nhisp"              #9
+
+    ]
+
+
+    #pulling all the counts into numpy in one go so the math runs on whole columns instead of row by row
+    oidField = arcpy.Describe(outPath).OIDFieldName
+    arr = arcpy.da.FeatureClassToNumPyArray(outPath, [oidField] + cursorfields[:8], null_value=0)
+
+    pop = arr[field_map["pop"]].astype(np.float64)
+    hasPop = pop > 0
+    safePop = np.where(hasPop, pop, 1.0) #tracts with no pop get 0 at the end anyway, this just avoids dividing by 0
+
+    raceKeys = ["white", "black", "ameri", "asian", "hawnpi", "hisp"] #same columns as range(1,7) in the loop version below (cursor indices 1-6)
+    R = np.column_stack([arr[field_map[k]] for k in raceKeys]).astype(np.float64) #(N,6) group counts
+    allracesquaresum = ((R / safePop[:, None])**2).sum(axis=1)
+    perHisp = arr[field_map["hisp"]] / safePop
+    perNhisp = 1 - perHisp
+    hisp_nhips_squared = perHisp**2 + perNhisp**2
+    divIndex = 1 - (allracesquaresum * hisp_nhips_squared)
+
+    divIndex = np.where(hasPop & (divIndex < .9999), divIndex, 0) #this is to fix any outliers and the empty tracts
+    perNhisp = np.where(hasPop, perNhisp, 0)
+
+    results = dict(zip(arr[oidField].tolist(), zip(divIndex.tolist(), perNhisp.tolist())))
+
+    with arcpy.da.UpdateCursor(outPath, ["OID@", "div_index", "per_Nhisp"]) as cursor: #math is already done so this cursor only writes
+        for row in cursor:
+            row[1], row[2] = results[row[0]]
+            cursor.updateRow(row)
 
+    #This is another way to set up the conditions of the loop for the cursor.
+    # with arcpy.da.UpdateCursor(outPath, cursorfields) as cursor:
+    #     for row in cursor:
+    #         if row[0] and row[0]>0:
+    #             pop = row[0]
+    #             sum_race_squared = sum([((row[i])/pop)**2 for i in range(1,7)])
+    #             perHisp = (row[6] or 0)/pop
+    #             per_Nhisp = 1 - perHisp
+    #             his_nhisp_squared = perHisp**2 + per_Nhisp**2
+    #             row[8] = 1 - (sum_race_squared * his_nhisp_squared)
+    #             row[9] = per_Nhisp
 
 
 
 
+    #         else:# if pop is 0 or null ill preset these values for it
+    #             row[8]= 0
+    #             row[9]= 0
+    #         cursor.updateRow(row)
 
 
-   
+    print(f"Diversity Index calculation completed. Results saved in: {outPath}")
+    return outPath
 
 
+#each worker writes to its own gdb: file-gdb schema locks make several processes creating feature classes in one gdb unreliable.
+#main() copies the result into outgdb afterwards, so the output ends up in the same place as a single county run
+def county_staging_gdb(county):
+    name = f"{county}_staging.gdb"
+    path = os.path.join(output_folder, name)
+    if not os.path.isdir(path):
+        arcpy.management.CreateFileGDB(output_folder, name)
+    return path
 
 
+def main():
+    #here i am galncing at the fields in the input data to see what i need and what I have
+    fieldsNameTract = [f.name for f in arcpy.ListFields(inputTract)]
+    print(f"Fields in the input data: {fieldsNameTract}") 
+    if not os.path.isdir(outgdb): #a file gdb is just a folder so a plain stat is enough. made once here before any county runs
+        arcpy.management.CreateFileGDB(output_folder, gdb_name)
+    else:
+        print(f"GDB already exist:{outgdb}")
+
+    if len(COUNTIES) <= 1:
+        for county, fips in COUNTIES.items():
+            run_diversity_index(county, fips, inputTract, outgdb)
+        return
+
+    #each county writes its own feature class into its own staging gdb, so counties can run in separate processes
+    failed = []
+    with ProcessPoolExecutor(max_workers=min(len(COUNTIES), max(1, (os.cpu_count() or 2) // 2))) as executor:
+        futures = {executor.submit(run_diversity_index, county, fips, inputTract, county_staging_gdb(county)): county for county, fips in COUNTIES.items()}
+        for future in as_completed(futures):
+            county = futures[future]
+            try:
+                stagedPath = future.result()
+                #only the parent writes to outgdb, one county at a time
+                arcpy.management.Copy(stagedPath, os.path.join(outgdb, os.path.basename(stagedPath)))
+                arcpy.management.Delete(os.path.dirname(stagedPath))
+            except Exception as e:
+                print(f"Diversity Index failed for {county}: {e}")
+                failed.append(county)
+
+    if failed:
+        print(f"Diversity Index failed for {len(failed)} of {len(COUNTIES)} counties: {', '.join(sorted(failed))}")
+        sys.exit(1) #non-zero exit so batch callers see the failure
+
+
+if __name__ == "__main__":
+    main()
@@ -19,7 +19,22 @@
 
 import arcpy              # ArcGIS Python site package
 import os                 # For file and folder operations
+import csv                # Reads the deed CSV header for the pyarrow column types
 import pandas as pd       # For CSV / tabular data cleanup (optional)
+import logging            # For status messages (DEBUG shows extra detail)
+from functools import reduce, lru_cache  # Null-mask combining / Describe caching
+
+# pyarrow gives a multithreaded C++ CSV reader for large deed extracts (optional)
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pv
+    import pyarrow.compute as pc
+    PYARROW_AVAILABLE = True
+except ImportError:
+    pa = None
+    pv = None
+    pc = None
+    PYARROW_AVAILABLE = False
 
 
 # -----------------------------
@@ -36,6 +51,15 @@ arcpy.env.workspace = r"C:\GIS\OnslowCounty\OnslowGIS.gdb"
 gdb = arcpy.env.workspace
 
 
+# -----------------------------
+# LOGGING SETUP
+# -----------------------------
+
+# INFO for normal runs; set to logging.DEBUG to see per-layer detail messages
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger("Parcel_Management")
+
+
 # -----------------------------
 # OUTPUT FOLDER SETUP
 # -----------------------------
@@ -72,25 +96,37 @@ nc_sp = arcpy.SpatialReference(32119)
 # FUNCTION: ENSURE CORRECT PROJECTION
 # -----------------------------
 
-def ensure_projection(fc, spatial_ref):
+@lru_cache(maxsize=None)
+def _sr_code(fc):
+    """
+    Returns the WKID (factoryCode) of a feature class.
+    Cached so each feature class is only described once per run.
+    """
+    return arcpy.Describe(fc).spatialReference.factoryCode
+
+
+def ensure_projection(fc, spatial_ref, desc=None):
     """
     Checks a feature class projection.
     If incorrect, creates a projected copy.
     Returns a feature class guaranteed to be in the correct CRS.
+    Pass desc if the feature class was already described to skip another Describe.
     """
-    desc = arcpy.Describe(fc)
+    fc_code = desc.spatialReference.factoryCode if desc is not None else _sr_code(fc)
+
+    # Fast path: same WKID means nothing to do (0 is a custom SR with no WKID, so re-project it)
+    if fc_code == spatial_ref.factoryCode and fc_code != 0:
+        return fc
 
-    # Compare spatial reference names
-    if desc.spatialReference.name != spatial_ref.name:
-        projected_fc = f"{fc}_proj"
+    projected_fc = f"{fc}_proj"
 
-        # Project to required coordinate system
-        arcpy.Project_management(fc, projected_fc, spatial_ref)
+    # Project to required coordinate system
+    arcpy.Project_management(fc, projected_fc, spatial_ref)
 
-        return projected_fc
+    # A dataset was (re)written, so drop any cached codes
+    _sr_code.cache_clear()
 
-    # If already correct, return original
-    return fc
+    return projected_fc
 
 
 # -----------------------------
@@ -115,8 +151,8 @@ arcpy.RepairGeometry_management(parcels)
 # FIELD MANAGEMENT
 # -----------------------------
 
-# Get list of existing fields
-existing_fields = [f.name for f in arcpy.ListFields(parcels)]
+# Get the existing field names once (set for fast membership checks)
+existing_fields = {f.name for f in arcpy.ListFields(parcels)}
 
 # Add acreage field if it doesn't exist
 if "ACRES" not in existing_fields:
@@ -137,37 +173,29 @@ if "OWNER_UPPER" not in existing_fields:
 
 
 # -----------------------------
-# FIELD CALCULATIONS
+# FIELD CALCULATIONS + DATA QUALITY CHECK
 # -----------------------------
 
-# Calculate parcel acreage using geometry
-arcpy.CalculateField_management(
-    parcels,
-    "ACRES",
-    "!shape.area@acres!",
-    "PYTHON3"
-)
-
-# Normalize owner names to uppercase
-# This improves consistency for joins and searches
-with arcpy.da.UpdateCursor(parcels, ["OWNER", "OWNER_UPPER"]) as cursor:
-    for row in cursor:
-        if row[0]:                  # Check for null values
-            row[1] = row[0].upper()
-            cursor.updateRow(row)
-
+# One pass over the parcels does all three jobs:
+#   - ACRES from the shape area
+#   - OWNER_UPPER (uppercase owner names for consistent joins and searches)
+#   - count of parcels missing owner information
 
-# -----------------------------
-# ATTRIBUTE DATA QUALITY CHECK
-# -----------------------------
+# SHAPE@AREA is in the layer's linear units squared, so convert it to acres
+# using the spatial reference (works for both feet and meter State Plane)
+SQ_METERS_PER_ACRE = 4046.8564224
+# (parcels is guaranteed to be in nc_sp by ensure_projection, so no Describe needed)
+meters_per_unit = nc_sp.metersPerUnit
+area_to_acres = (meters_per_unit ** 2) / SQ_METERS_PER_ACRE
 
-# Count parcels missing owner information
 missing_owner_count = 0
 
-with arcpy.da.SearchCursor(parcels, ["OWNER"]) as cursor:
+with arcpy.da.UpdateCursor(parcels, ["SHAPE@AREA", "OWNER", "OWNER_UPPER", "ACRES"]) as cursor:
     for row in cursor:
-        if row[0] is None:
-            missing_owner_count += 1
+        row[3] = row[0] * area_to_acres if row[0] is not None else None
+        row[2] = row[1].upper() if row[1] else None
+        missing_owner_count += row[1] is None
+        cursor.updateRow(row)
 
 print(f"Parcels missing owner info: {missing_owner_count}")
 
@@ -226,7 +254,17 @@ arcpy.MakeFeatureLayer_management(
 
 # Repair geometry on ALL feature classes in the GDB
 # (This is common maintenance work in county GIS)
+# Parcels were already repaired above, and the buffer and school join outputs
+# take their geometry from those repaired parcels, so skip those.
+# (Roads_Clipped and Parcels_FloodRisk also carry geometry from roads, the county
+# boundary and flood zones, which are never repaired, so they still get repaired here.)
+already_repaired = {parcels, parcel_buffer, parcels_schools}
+
 for fc in arcpy.ListFeatureClasses():
+    if fc in already_repaired:
+        continue
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Repairing geometry: %s", fc)
     arcpy.RepairGeometry_management(fc)
 
 
@@ -238,17 +276,42 @@ for fc in arcpy.ListFeatureClasses():
 csv_path = r"C:\GIS\OnslowCounty\Input\deeds.csv"
 
 if os.path.exists(csv_path):
-    df = pd.read_csv(csv_path)
-
-    # Remove rows with missing values
-    df.dropna(inplace=True)
-
     cleaned_csv = os.path.join(
         output_folder,
         "deeds_cleaned.csv"
     )
 
-    df.to_csv(cleaned_csv, index=False)
+    # Both paths keep every value as the original text (no number/date/bool re-formatting),
+    # treat the same tokens as missing, and write through pandas, so the cleaned CSV
+    # is the same file whether or not pyarrow is installed
+    null_tokens = ["", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+                   "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"]
+
+    if PYARROW_AVAILABLE:
+        # Parse with pyarrow's multithreaded reader; every column as string (header read first for the names)
+        with open(csv_path, newline="", encoding="utf-8-sig") as f:
+            header = next(csv.reader(f), [])
+        tbl = pv.read_csv(
+            csv_path,
+            convert_options=pv.ConvertOptions(
+                column_types={name: pa.string() for name in header},
+                null_values=null_tokens,
+                strings_can_be_null=True
+            )
+        )
+
+        # Remove rows with missing values in any column
+        keep = reduce(pc.and_, [pc.is_valid(col) for col in tbl.columns])
+        tbl = tbl.filter(keep)
+
+        tbl.to_pandas().to_csv(cleaned_csv, index=False)
+    else:
+        df = pd.read_csv(csv_path, dtype=str, na_values=null_tokens, keep_default_na=False)
+
+        # Remove rows with missing values
+        df.dropna(inplace=True)
+
+        df.to_csv(cleaned_csv, index=False)
 
 
 # -----------------------------
@@ -3,31 +3,97 @@ import os
 import sys
 import numpy as np
 import csv
-import traceback
-import tempfile
+import atexit
+import logging
+import logging.handlers
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
 from collections import defaultdict # Kept for completeness, though currently unused
 
+# =====================================================
+# LOGGING SETUP (Queue-based: console/file I/O runs on a background thread)
+# =====================================================
+# Only the parent process owns the log file. Worker processes re-import this module, so they skip
+# the setup (and the import-time banners) and send their records to the parent's queue instead.
+LOG_FILE = os.path.splitext(os.path.abspath(__file__))[0] + ".log"
+IS_WORKER = multiprocessing.current_process().name != "MainProcess" # Already set while a spawned worker re-imports this module
+
+if IS_WORKER:
+    logging.getLogger().addHandler(logging.NullHandler()) # Replaced by init_worker_logging once the pool starts it
+    log_queue = None
+else:
+    log_queue = multiprocessing.Queue(-1) # Process-safe, so workers can log into the same listener
+    logging.getLogger().addHandler(logging.handlers.QueueHandler(log_queue))
+
+    _log_format = logging.Formatter("%(message)s")
+    _file_handler = logging.FileHandler(LOG_FILE, encoding="utf-8")
+    _file_handler.setFormatter(_log_format)
+    _console_handler = logging.StreamHandler(sys.stdout)
+    _console_handler.setFormatter(_log_format)
+
+    log_listener = logging.handlers.QueueListener(log_queue, _file_handler, _console_handler)
+    log_listener.start()
+    atexit.register(log_listener.stop) # Drains the queue on normal exit and sys.exit()
+logging.getLogger().setLevel(logging.INFO)
+
+def init_worker_logging(parent_queue):
+    """Pool initializer: routes this worker's log records to the parent's listener (one writer for the log file)."""
+    root = logging.getLogger()
+    root.handlers[:] = [logging.handlers.QueueHandler(parent_queue)]
+    root.setLevel(logging.INFO)
+
+logger = logging.getLogger("anime_proximity_batch")
+
 # --- Scipy Check for Statistical Tests ---
 try:
     from scipy import stats
+    from scipy.spatial import cKDTree
+    from scipy.special import stdtr
     SCIPY_AVAILABLE = True
-    print("✅ SciPy detected: statistical tests enabled.")
+    logger.info("✅ SciPy detected: statistical tests enabled.")
 except ImportError:
     stats = None
+    cKDTree = None
+    stdtr = None
     SCIPY_AVAILABLE = False
-    print("⚠️ SciPy not found — Welch t-test will be skipped.")
+    logger.warning("⚠️ SciPy not found — Welch t-test will be skipped.")
+
+# --- Shapely Check for In-Process Random Point Sampling ---
+try:
+    import shapely
+    if not hasattr(shapely, "contains_xy"): # Vectorized predicates need Shapely 2.x
+        raise ImportError("Shapely 2.x required")
+    SHAPELY_AVAILABLE = True
+    logger.info("✅ Shapely detected: random points sampled in-process.")
+except ImportError:
+    shapely = None
+    SHAPELY_AVAILABLE = False
+    logger.warning("⚠️ Shapely 2.x not found — random points will use Dissolve + CreateRandomPoints.")
+
+# --- PySAL Check for In-Process Gi* Hot Spots ---
+try:
+    from libpysal.weights import DistanceBand
+    from esda.getisord import G_Local
+    PYSAL_AVAILABLE = True
+    logger.info("✅ PySAL (esda/libpysal) detected: Gi* hot spots computed in-process.")
+except ImportError:
+    DistanceBand = None
+    G_Local = None
+    PYSAL_AVAILABLE = False
+    logger.warning("⚠️ PySAL not found — Gi* will use SummarizeWithin + HotSpots.")
     
 # =====================================================
 # CONFIGURATION CONSTANTS (Global for ALL Projects)
 # =====================================================
-print("\n[STEP 1] Setting up project configuration...")
+logger.info("\n[STEP 1] Setting up project configuration...")
 arcpy.env.overwriteOutput = True
 
 # --- DYNAMIC PROJECT DISCOVERY (Set your single base path here) ---
 BASE_PROJECT_DIR = r"C:\ArcPyProjects\AutomatedAnimeStoreProximityByCity"
 
 if not os.path.exists(BASE_PROJECT_DIR):
-    print(f"❌ ERROR: Base project directory not found: {BASE_PROJECT_DIR}")
+    logger.error(f"❌ ERROR: Base project directory not found: {BASE_PROJECT_DIR}")
     sys.exit(1)  # Stop if the folder doesn't exist
 
 # --- USER CONFIGURATION: Choose which cities to process ---
@@ -47,17 +113,29 @@ elif isinstance(PROCESS_CITIES, list):
     # Only include folders that exist
     selected_projects = [c for c in PROCESS_CITIES if c in all_project_names]
 else:
-    print("❌ Invalid value for PROCESS_CITIES. Must be 'all' or a list of city names.")
+    logger.error("❌ Invalid value for PROCESS_CITIES. Must be 'all' or a list of city names.")
     sys.exit(1)
 
 # Build full paths
 PROJECT_FOLDERS_TO_PROCESS = [os.path.join(BASE_PROJECT_DIR, name) for name in selected_projects]
 
-print(f"Projects queued: {selected_projects}")
+logger.info(f"Projects queued: {selected_projects}")
+
+# --- PARALLEL CONFIGURATION ---
+# Each city reads its own inputs and writes its own GDB, so cities can run in separate processes.
+# Half the cores: each city is mostly disk I/O plus ArcGIS licensing per process, so more workers just contend.
+# Set to 1 to process the cities one after another in this process.
+MAX_WORKERS = min(len(PROJECT_FOLDERS_TO_PROCESS), max(1, (os.cpu_count() or 2) // 2))
 
 # Define Target CRS: JGD2011 / UTM Zone 54N (WKID 6697)
+# Built once at import (once per worker process) and passed around as this same object.
 TARGET_SR = arcpy.SpatialReference(6697)
 
+# Near-distance method: every point is projected to TARGET_SR before the near step, so in a
+# projected (UTM) CRS a straight-line PLANAR distance is accurate and much cheaper than GEODESIC.
+# If TARGET_SR is ever switched to a geographic (degree-based) CRS, keep GEODESIC.
+NEAR_METHOD = "PLANAR" if TARGET_SR.type == "Projected" else "GEODESIC"
+
 # Output Layer Names (Standardized - Base names used within the active GDB)
 GDB_LAYERS = {
     "boundary_proj": "Boundary_UTM_Cleaned",
@@ -75,67 +153,200 @@ GDB_LAYERS = {
 # HELPER FUNCTIONS (UNCHANGED CORE LOGIC)
 # =====================================================
 
+# --- GDB catalog cache: one listing per city instead of an arcpy.Exists catalog probe per check ---
+_gdb_catalog = set()
+
+def refresh_gdb_catalog():
+    """Lists the feature classes and tables of the active workspace once and caches their names."""
+    _gdb_catalog.clear()
+    names = (arcpy.ListFeatureClasses() or []) + (arcpy.ListTables() or [])
+    _gdb_catalog.update(name.lower() for name in names)
+
+def _in_active_gdb(path):
+    """True if path points directly inside the active workspace GDB (the part the catalog covers)."""
+    workspace = arcpy.env.workspace or ""
+    return os.path.normcase(os.path.dirname(path)) == os.path.normcase(workspace)
+
+def layer_exists(path):
+    """Checks the cached catalog for datasets in the active GDB; falls back to arcpy.Exists elsewhere."""
+    if _in_active_gdb(path):
+        return os.path.basename(path).lower() in _gdb_catalog
+    return arcpy.Exists(path)
+
+def mark_created(path):
+    """Records a dataset that a tool just wrote, so later checks see it without re-listing."""
+    if _in_active_gdb(path):
+        _gdb_catalog.add(os.path.basename(path).lower())
+
+def delete_if_exists(path):
+    """Deletes a dataset if present and keeps the catalog cache in sync."""
+    if layer_exists(path):
+        arcpy.management.Delete(path)
+        _gdb_catalog.discard(os.path.basename(path).lower())
+
 def check_exists_layer(path, datatype="Feature Class"):
     """Checks if a feature class exists."""
-    if not arcpy.Exists(path):
+    if not layer_exists(path):
         raise FileNotFoundError(f"❌ Missing {datatype}: {path}")
-    print(f"✔ Exists: {path}")
+    logger.info(f"✔ Exists: {path}")
 
 def near_distances_to_array(near_table):
     """Extracts distances from a Near Table's NEAR_DIST field and returns as a NumPy array."""
-    dist = []
-    with arcpy.da.SearchCursor(near_table, ["NEAR_DIST"]) as cur:
-        for (d,) in cur:
-            if d is not None:
-                dist.append(d)
-    return np.array(dist, dtype=float)
+    # Bulk read in C (null distances skipped) instead of appending row by row in Python
+    arr = arcpy.da.TableToNumPyArray(near_table, "NEAR_DIST", skip_nulls=True)["NEAR_DIST"]
+    return arr.astype(np.float64, copy=False)
+
+def point_oid_xy(fc):
+    """Reads point OIDs and coordinates as (oids, (N, 2) float array)."""
+    arr = arcpy.da.FeatureClassToNumPyArray(fc, ["OID@", "SHAPE@XY"])
+    return arr["OID@"], arr["SHAPE@XY"]
+
+def xy_by_oid(fc, id_field):
+    """Reads point XYs into an (max_oid + 1, 2) array indexed directly by OID; missing OIDs are NaN."""
+    arr = arcpy.da.FeatureClassToNumPyArray(fc, [id_field, "SHAPE@XY"])
+    max_oid = int(arr[id_field].max()) if arr.size else -1
+    xy = np.full((max_oid + 1, 2), np.nan)
+    xy[arr[id_field]] = arr["SHAPE@XY"]
+    return xy
 
 def near_table_to_lines(near_table, in_fc, near_fc, out_fc, target_sr):
     """Turns a Near Table into Polyline features."""
-    print(f"Creating near lines: {os.path.basename(out_fc)}...")
-    if arcpy.Exists(out_fc):
-        arcpy.management.Delete(out_fc)
+    logger.info(f"Creating near lines: {os.path.basename(out_fc)}...")
     
     # Dynamically determine the ID field name (OIDFieldName)
     in_id_field = arcpy.Describe(in_fc).OIDFieldName
     near_id_field = arcpy.Describe(near_fc).OIDFieldName
     
-    arcpy.management.CreateFeatureclass(
-        out_path=os.path.dirname(out_fc),
-        out_name=os.path.basename(out_fc),
-        geometry_type="POLYLINE",
+    # Bulk-read point coordinates (as OID-indexed arrays) and near pairs instead of walking SearchCursors
+    in_xy = xy_by_oid(in_fc, in_id_field)
+    near_xy = xy_by_oid(near_fc, near_id_field)
+    pairs = arcpy.da.TableToNumPyArray(near_table, ["IN_FID", "NEAR_FID"])
+    in_fids, near_fids = pairs["IN_FID"], pairs["NEAR_FID"]
+
+    # Keep pairs whose OIDs exist on both sides (NEAR_FID is -1 when nothing was found)
+    valid = (in_fids >= 0) & (in_fids < len(in_xy)) & (near_fids >= 0) & (near_fids < len(near_xy))
+    in_fids, near_fids = in_fids[valid], near_fids[valid]
+    starts = in_xy[in_fids]
+    ends = near_xy[near_fids]
+    found = ~(np.isnan(starts[:, 0]) | np.isnan(ends[:, 0]))
+
+    write_near_lines(in_fids[found], starts[found], ends[found], out_fc, target_sr)
+
+def write_near_lines(in_fids, starts, ends, out_fc, target_sr):
+    """Writes one straight line per (start, end) XY pair to out_fc, tagged with the start point's OID."""
+    delete_if_exists(out_fc)
+
+    # Start/end coordinate table, built with array ops and held in memory
+    lines = np.empty(len(in_fids), dtype=[("IN_FID", "i4"), ("sx", "f8"), ("sy", "f8"), ("ex", "f8"), ("ey", "f8")])
+    lines["IN_FID"] = in_fids
+    lines["sx"], lines["sy"] = starts[:, 0], starts[:, 1]
+    lines["ex"], lines["ey"] = ends[:, 0], ends[:, 1]
+
+    xy_table = "memory/near_xy_tbl"
+    delete_if_exists(xy_table)
+    arcpy.da.NumPyArrayToTable(lines, xy_table)
+
+    # XYToLine builds every line natively in one call instead of one arcpy.Polyline per row
+    # PLANAR keeps them straight two-vertex lines, same as the old Polyline output (GEODESIC would densify them)
+    arcpy.management.XYToLine(
+        xy_table, out_fc, "sx", "sy", "ex", "ey",
+        line_type="PLANAR",
+        id_field="IN_FID",
         spatial_reference=target_sr
     )
+    arcpy.management.Delete(xy_table)
     
-    in_points = {row[0]: row[1] for row in arcpy.da.SearchCursor(in_fc, [in_id_field, "SHAPE@XY"])}
-    near_points = {row[0]: row[1] for row in arcpy.da.SearchCursor(near_fc, [near_id_field, "SHAPE@XY"])}
-    
-    with arcpy.da.InsertCursor(out_fc, ["SHAPE@"]) as ins_cur:
-        with arcpy.da.SearchCursor(near_table, ["IN_FID", "NEAR_FID"]) as near_cur:
-            for in_fid, near_fid in near_cur:
-                if in_fid in in_points and near_fid in near_points:
-                    start = in_points[in_fid]
-                    end = near_points[near_fid]
-                    line = arcpy.Polyline(arcpy.Array([arcpy.Point(*start), arcpy.Point(*end)]))
-                    ins_cur.insertRow([line])
-    
-    print(f"✅ Near lines created: {os.path.basename(out_fc)}")
+    logger.info(f"✅ Near lines created: {os.path.basename(out_fc)}")
 
-def run_near_table(in_fc, near_fc, out_table): 
-    """Generates a Near Table."""
-    print(f"Generating near table: {out_table}...")
-    if arcpy.Exists(out_table):
-        arcpy.management.Delete(out_table)
+def run_near_table(in_fc, near_fc, out_table, method=NEAR_METHOD): 
+    """Generates a Near Table (inputs must already be in TARGET_SR)."""
+    logger.info(f"Generating near table: {out_table} ({method})...")
+    delete_if_exists(out_table)
     arcpy.analysis.GenerateNearTable(
-        in_fc, near_fc, out_table, closest="1", method="GEODESIC"
+        in_fc, near_fc, out_table, closest="1", method=method
     )
-    print(f"✅ Near Table created: {out_table}")
+    mark_created(out_table)
+    logger.info(f"✅ Near Table created: {out_table}")
+
+def project_if_needed(src, dst, sr):
+    """Writes src to dst in sr: a plain copy when src already has the same WKID, otherwise a Project."""
+    src_code = arcpy.Describe(src).spatialReference.factoryCode
+    if src_code == sr.factoryCode and src_code != 0: # 0 is a custom SR with no WKID, so always project it
+        arcpy.management.CopyFeatures(src, dst)
+    else:
+        arcpy.management.Project(src, dst, sr)
+    return dst
+
+@lru_cache(maxsize=16)
+def _read_csv(csv_path, mtime):
+    """Parses a CSV once into (header, rows); cached per (path, modification time), so an edited file is re-read."""
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = tuple(next(reader, []))
+        rows = tuple(tuple(row) for row in reader)
+    return header, rows
+
+def read_csv_cached(csv_path):
+    """Returns the cached (header, rows) for csv_path; the header lookup and the column load share one parse."""
+    return _read_csv(csv_path, os.path.getmtime(csv_path))
+
+def discover_pop_field(csv_path):
+    """Returns the first numeric CSV column with 'Pop' in its name (read from the header and first data row)."""
+    header, rows = read_csv_cached(csv_path)
+    first_row = rows[0] if rows else ()
+
+    for i, name in enumerate(header):
+        if "Pop" not in name or "ADM2_EN" in name:
+            continue
+        try:
+            float(first_row[i])
+        except (IndexError, ValueError):
+            continue # Not a numeric column
+        return name
+    return None
+
+def random_points_in_polygons(poly_fc, n_points, rng=None):
+    """Samples n_points uniform random XYs inside the union of poly_fc's polygons (NumPy rejection sampling)."""
+    geoms = [shapely.from_wkb(bytes(g.WKB)) for (g,) in arcpy.da.SearchCursor(poly_fc, ["SHAPE@"]) if g is not None]
+    area = shapely.union_all(geoms)
+    shapely.prepare(area)
+    minx, miny, maxx, maxy = area.bounds
+    hit_rate = area.area / ((maxx - minx) * (maxy - miny)) # Share of the bounding box covered by the polygons
+
+    rng = rng or np.random.default_rng()
+    accepted = np.empty((0, 2))
+    while len(accepted) < n_points:
+        # Draw enough candidates to (usually) finish in one round, given the expected rejection rate
+        n_draw = int((n_points - len(accepted)) / max(hit_rate, 1e-6) * 1.2) + 16
+        draw = rng.uniform([minx, miny], [maxx, maxy], size=(n_draw, 2))
+        inside = shapely.contains_xy(area, draw[:, 0], draw[:, 1])
+        accepted = np.vstack([accepted, draw[inside]])
+    return accepted[:n_points]
+
+def load_csv_columns(csv_path, key_field, value_field):
+    """Reads a text key column and a numeric value column from a CSV into a NumPy structured array (non-numeric rows skipped)."""
+    header, rows = read_csv_cached(csv_path)
+    key_i, value_i = header.index(key_field), header.index(value_field)
+    keys, values = [], []
+    for row in rows:
+        try:
+            value = float(row[value_i])
+            key = row[key_i]
+        except (IndexError, ValueError):
+            continue
+        keys.append(key)
+        values.append(value)
+
+    width = max((len(k) for k in keys), default=1)
+    arr = np.empty(len(keys), dtype=[(key_field, f"U{width}"), (value_field, "f8")])
+    arr[key_field] = keys
+    arr[value_field] = values
+    return arr
 
 def run_lisa(poly_fc, value_field, output_fc):
     """Runs Optimized Outlier Analysis (LISA)."""
-    print("\n🔹 Running LISA analysis using OptimizedOutlierAnalysis...")
-    if arcpy.Exists(output_fc):
-        arcpy.management.Delete(output_fc)
+    logger.info("\n🔹 Running LISA analysis using OptimizedOutlierAnalysis...")
+    delete_if_exists(output_fc)
     
     try:
         arcpy.stats.OptimizedOutlierAnalysis(
@@ -143,11 +354,56 @@ def run_lisa(poly_fc, value_field, output_fc):
             Analysis_Field=value_field, # Using calculated 'pop_dens' field
             Output_Features=output_fc
         )
-        print(f"✅ LISA analysis complete. Output saved at: {output_fc}")
+        mark_created(output_fc)
+        logger.info(f"✅ LISA analysis complete. Output saved at: {output_fc}")
     except Exception as e:
-        print(f"❌ LISA analysis failed: {e}")
+        logger.error(f"❌ LISA analysis failed: {e}")
         raise
 
+def gi_star_hotspots(poly_fc, point_fc, output_fc, band_m):
+    """Counts points per polygon and runs Gi* (fixed distance band, row-standardized) in-process.
+
+    Needs a projected TARGET_SR: band_m is converted to its linear unit and used as a planar distance.
+
+    Writes the same result fields as arcpy.stats.HotSpots (POINT_COUNT, GiZScore, GiPValue,
+    NNeighbors, Gi_Bin) onto a copy of poly_fc.
+    """
+    delete_if_exists(output_fc)
+    arcpy.management.CopyFeatures(poly_fc, output_fc)
+    mark_created(output_fc)
+
+    # Polygons, their centroids (distances for the band) and the points, read straight off the copy
+    oids, wkbs, centroids = [], [], []
+    with arcpy.da.SearchCursor(output_fc, ["OID@", "SHAPE@WKB", "SHAPE@TRUECENTROID"]) as cursor:
+        for oid, wkb, xy in cursor:
+            oids.append(oid)
+            wkbs.append(bytes(wkb))
+            centroids.append(xy)
+    polys = shapely.from_wkb(wkbs)
+    _, point_xy = point_oid_xy(point_fc)
+
+    # Count points per polygon with one STRtree query (same role as SummarizeWithin's POINT_COUNT)
+    tree = shapely.STRtree(polys)
+    _, poly_idx = tree.query(shapely.points(point_xy), predicate="intersects")
+    counts = np.bincount(poly_idx, minlength=len(polys)).astype(np.float64)
+
+    # Binary fixed-distance weights (FIXED_DISTANCE_BAND) with row standardization; star=True includes the polygon itself
+    w = DistanceBand(np.asarray(centroids), threshold=band_m / TARGET_SR.metersPerUnit, binary=True, silence_warnings=True)
+    gi = G_Local(counts, w, transform="R", star=True, permutations=0)
+    z = np.nan_to_num(gi.Zs) # Isolated polygons have no neighbours and get a neutral score
+    p = 2 * stats.norm.sf(np.abs(z)) # Two-tailed, as reported by HotSpots
+
+    result = np.empty(len(oids), dtype=[("JOIN_OID", "i4"), ("POINT_COUNT", "i4"), ("GiZScore", "f8"),
+                                        ("GiPValue", "f8"), ("NNeighbors", "i4"), ("Gi_Bin", "i2")])
+    result["JOIN_OID"] = oids
+    result["POINT_COUNT"] = counts
+    result["GiZScore"] = z
+    result["GiPValue"] = p
+    result["NNeighbors"] = [w.cardinalities[i] + 1 for i in w.id_order]
+    # 99% / 95% / 90% confidence bins, signed by hot (+) or cold (-)
+    result["Gi_Bin"] = np.sign(z) * np.select([p <= 0.01, p <= 0.05, p <= 0.10], [3, 2, 1], 0)
+    arcpy.da.ExtendTable(output_fc, arcpy.Describe(output_fc).OIDFieldName, result, "JOIN_OID", append_only=False)
+
 # =====================================================
 # DYNAMIC FUNCTION BLOCK (Receives city-specific paths)
 # =====================================================
@@ -158,7 +414,7 @@ def run_lisa(poly_fc, value_field, output_fc):
 def prepare_population_data(input_folder, output_folder, project_name, analysis_gdb, target_sr):
     """Projects boundary, joins population data, calculates density, and rasterizes for the current city."""
     
-    print("\n[STEP 3] Preparing population data and rasterization...")
+    logger.info("\n[STEP 3] Preparing population data and rasterization...")
     
     # --- DYNAMIC INPUTS (Using Generic Names) ---
     BOUNDARY_FC_RAW = os.path.join(input_folder, "MunicipalBoundaries.shp") # <-- Generic Name
@@ -167,77 +423,83 @@ def prepare_population_data(input_folder, output_folder, project_name, analysis_
     # --- OUTPUT PATHS ---
     POP_RASTER = os.path.join(output_folder, f"population_density_{project_name}_utm.tif")
     
-    # --- INTERMEDIATE/OUTPUT PATHS (In the current city's GDB) ---
-    boundary_projected = os.path.join(analysis_gdb, f"{project_name}_MunicipalBoundaries_UTM_Intermediate")
-    boundary_joined_w_pop = os.path.join(analysis_gdb, f"{project_name}_MunicipalBoundaries_Joined_Intermediate")
+    # --- INTERMEDIATE PATHS (memory workspace: only read by the next tools in this run) ---
+    boundary_projected = f"memory/{project_name}_MunicipalBoundaries_UTM_Intermediate"
+
+    # --- OUTPUT PATHS (In the current city's GDB) ---
     cleanedBoundariesJoined = os.path.join(analysis_gdb, GDB_LAYERS["boundary_proj"])
 
     # 1. Project raw boundary
-    arcpy.management.Project(BOUNDARY_FC_RAW, boundary_projected, target_sr)
-    print("✅ Boundary projected.")
-
-    # 2. Join population CSV 
-    layer_name = f"{project_name}_boundary_lyr"
-    arcpy.management.MakeFeatureLayer(boundary_projected, layer_name)
-    arcpy.management.AddJoin(layer_name, "ADM2_EN", POPULATION_CSV, "ADM2_EN")
-    arcpy.management.CopyFeatures(layer_name, boundary_joined_w_pop)
-    arcpy.management.RemoveJoin(layer_name)
-    print(f"✅ Population CSV joined to boundary.")
-
-    # 3. Add area_km2 field and calculate area
-    arcpy.management.AddField(boundary_joined_w_pop, "area_km2", "DOUBLE")
-    arcpy.management.CalculateField(boundary_joined_w_pop, "area_km2", "!shape.area@SQUAREKILOMETERS!", "PYTHON3")
-
-    # 4. Calculate population density (using dynamic field discovery)
-    arcpy.management.AddField(boundary_joined_w_pop, "pop_dens", "DOUBLE")
-    
-    pop_field_name = None
-    all_fields = arcpy.ListFields(boundary_joined_w_pop) 
-    
-    for field in all_fields:
-        if ("Pop" in field.name) and \
-           (field.type in ('Float', 'Double', 'Integer', 'SmallInteger')) and \
-           (not "ADM2_EN" in field.name) and \
-           (not "area_km2" in field.name):
-            
-            pop_field_name = field.name
-            break
-            
+    project_if_needed(BOUNDARY_FC_RAW, boundary_projected, target_sr)
+    logger.info("✅ Boundary projected.")
+
+    # 2. Find the population column straight from the CSV header (no schema scan of the joined output)
+    pop_field_name = discover_pop_field(POPULATION_CSV)
     if pop_field_name is None:
-        raise Exception(f"Could not find the NUMERIC population field after the CSV join in {project_name}. Check your CSV column names for 'Pop'.")
+        raise Exception(f"Could not find the NUMERIC population column in {POPULATION_CSV} for {project_name}. Check your CSV column names for 'Pop'.")
         
-    print(f"ℹ️ Discovered NUMERIC Population Field Name: {pop_field_name}")
-
-    expression = f"!{pop_field_name}! / !area_km2!"
-    arcpy.management.CalculateField(
-        in_table=boundary_joined_w_pop, 
-        field="pop_dens", 
-        expression=expression, 
-        expression_type="PYTHON3"
+    logger.info(f"ℹ️ Discovered NUMERIC Population Field Name: {pop_field_name}")
+
+    # 3. Join population CSV 
+    # Load only the key + population columns and attach them in place with ExtendTable
+    # (no join layer, no full copy of the joined features). Unmatched polygons get a null population.
+    pop_arr = load_csv_columns(POPULATION_CSV, "ADM2_EN", pop_field_name)
+    arcpy.da.ExtendTable(boundary_projected, "ADM2_EN", pop_arr, "ADM2_EN", append_only=False)
+    boundary_joined_w_pop = boundary_projected
+    logger.info(f"✅ Population CSV joined to boundary.")
+
+    # 4. Calculate area_km2 and pop_dens as whole-column NumPy math, written back in one ExtendTable call
+    oid_field = arcpy.Describe(boundary_joined_w_pop).OIDFieldName
+    arr = arcpy.da.FeatureClassToNumPyArray(
+        boundary_joined_w_pop, ["OID@", "SHAPE@AREA", pop_field_name],
+        null_value={pop_field_name: -1} # Population is never negative, so -1 marks an unmatched polygon
     )
-    print("🧮 Population density calculated.")
+    if target_sr.type == "Projected":
+        # SHAPE@AREA is in the projected linear unit squared
+        area_km2 = arr["SHAPE@AREA"] * (target_sr.metersPerUnit ** 2) / 1e6
+    else:
+        # Geographic SR: SHAPE@AREA would be square degrees, so take the geodesic km² of each shape
+        # (same result as the unit-aware !shape.area@SQUAREKILOMETERS!), matched back by OID
+        with arcpy.da.SearchCursor(boundary_joined_w_pop, ["OID@", "SHAPE@"]) as cursor:
+            geodesic_km2 = {oid: shape.getArea("GEODESIC", "SQUAREKILOMETERS") if shape else 0.0 for oid, shape in cursor}
+        area_km2 = np.array([geodesic_km2[oid] for oid in arr["OID@"]], dtype=np.float64)
+    pop = arr[pop_field_name].astype(np.float64)
+    # Polygons with a real density (the ones that were non-null before); the others are only deleted below
+    valid = (pop >= 0) & (area_km2 > 0)
+
+    calc = np.empty(len(arr), dtype=[("JOIN_OID", "i4"), ("area_km2", "f8"), ("pop_dens", "f8")])
+    calc["JOIN_OID"] = arr["OID@"]
+    calc["area_km2"] = area_km2
+    # Invalid polygons get pop_dens 0, so they are removed with the bad rows below
+    calc["pop_dens"] = np.divide(pop, area_km2, out=np.zeros_like(pop), where=valid)
+    arcpy.da.ExtendTable(boundary_joined_w_pop, oid_field, calc, "JOIN_OID", append_only=False)
+    logger.info("🧮 Population density calculated.")
 
     # 5. Cap extreme population densities at the 99th percentile
-    dens_values = [row[0] for row in arcpy.da.SearchCursor(boundary_joined_w_pop, ["pop_dens"]) if row[0] is not None]
-    cap_value = np.percentile(dens_values, 99)
+    # Percentile of the valid densities only (unmatched / zero-area polygons are about to be deleted),
+    # taken from calc["pop_dens"] so there is no second read of the table
+    cap_value = float(np.percentile(calc["pop_dens"][valid], 99))
 
-    with arcpy.da.UpdateCursor(boundary_joined_w_pop, ["pop_dens"]) as cursor:
-        for row in cursor:
-            if row[0] is not None and row[0] > cap_value:
-                row[0] = cap_value
-                cursor.updateRow(row)
-    print("✅ Extreme pop_dens values capped.")
-
-    # 6. Clean bad polygons and save final municipal layer
-    arcpy.management.CopyFeatures(boundary_joined_w_pop, cleanedBoundariesJoined)
+    # 6. Clean bad polygons and cap pop_dens in the same pass, then save final municipal layer once
+    # The where_clause lets the workspace hand back only the rows that need a change
     bad_rows_deleted = 0
-    with arcpy.da.UpdateCursor(cleanedBoundariesJoined, ["area_km2", "pop_dens"]) as cursor:
+    fix_clause = (
+        "area_km2 IS NULL OR pop_dens IS NULL OR area_km2 <= 0 OR pop_dens <= 0 "
+        f"OR pop_dens > {cap_value!r}"
+    )
+    with arcpy.da.UpdateCursor(boundary_joined_w_pop, ["area_km2", "pop_dens"], where_clause=fix_clause) as cursor:
         for row in cursor:
             area, dens = row
             if area is None or dens is None or area <= 0 or dens <= 0:
                 cursor.deleteRow()
                 bad_rows_deleted += 1
-    print(f"✅ Deleted {bad_rows_deleted} bad polygons. Cleaned data ready.")
+            elif dens > cap_value:
+                row[1] = cap_value
+                cursor.updateRow(row)
+    arcpy.management.CopyFeatures(boundary_joined_w_pop, cleanedBoundariesJoined)
+    arcpy.management.Delete(boundary_projected) # Release the intermediate's RAM
+    logger.info("✅ Extreme pop_dens values capped.")
+    logger.info(f"✅ Deleted {bad_rows_deleted} bad polygons. Cleaned data ready.")
 
     # 7. Rasterize population density
     arcpy.conversion.PolygonToRaster(
@@ -247,9 +509,7 @@ def prepare_population_data(input_folder, output_folder, project_name, analysis_
         cell_assignment="CELL_CENTER",
         cellsize=0.0016
     )
-    arcpy.management.DefineProjection(POP_RASTER, target_sr)
-    arcpy.management.CalculateStatistics(POP_RASTER)
-    print(f"✅ Population raster created: {POP_RASTER}")
+    logger.info(f"✅ Population raster created: {POP_RASTER}")
     
     return cleanedBoundariesJoined # Return the path to the final polygon layer
 
@@ -258,7 +518,7 @@ def prepare_population_data(input_folder, output_folder, project_name, analysis_
 # -----------------------------------------------------
 def setup_point_data(input_folder, analysis_gdb, boundary_fc_cleaned, target_sr):
     """Projects anime stores and generates a control set of random points for the current city."""
-    print("\n[STEP 4] Setting up point data (Anime and Random)...")
+    logger.info("\n[STEP 4] Setting up point data (Anime and Random)...")
     
     # --- DYNAMIC INPUT ---
     ANIME_FC_RAW = os.path.join(input_folder, "PointLocations_Raw.shp") # <-- Generic Name
@@ -269,32 +529,61 @@ def setup_point_data(input_folder, analysis_gdb, boundary_fc_cleaned, target_sr)
     pop_centroids_fc = os.path.join(analysis_gdb, GDB_LAYERS["pop_centroids"])
 
     # 1. Project Anime Stores
-    arcpy.management.Project(ANIME_FC_RAW, anime_fc_proj, target_sr)
+    project_if_needed(ANIME_FC_RAW, anime_fc_proj, target_sr)
     n_anime = int(arcpy.management.GetCount(anime_fc_proj).getOutput(0))
     if n_anime == 0:
         raise ValueError("Anime store point layer is empty after projection.")
-    print(f"✅ Anime stores projected. Count: {n_anime}")
+    logger.info(f"✅ Anime stores projected. Count: {n_anime}")
 
     # 2. Generate Random Points 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        dissolved_fc = os.path.join(tmpdir, "dissolved_boundary.shp")
+    # Generate the same number of random points as there are anime stores
+    delete_if_exists(random_fc_gdb)
+
+    if SHAPELY_AVAILABLE:
+        # Sample inside the boundary in-process and write the points with one InsertCursor
+        random_xy = random_points_in_polygons(boundary_fc_cleaned, n_anime)
+        arcpy.management.CreateFeatureclass(
+            out_path=analysis_gdb,
+            out_name=GDB_LAYERS["random_proj"],
+            geometry_type="POINT",
+            spatial_reference=target_sr
+        )
+        with arcpy.da.InsertCursor(random_fc_gdb, ["SHAPE@XY"]) as ins_cur:
+            for xy in random_xy.tolist():
+                ins_cur.insertRow([tuple(xy)])
+    else:
+        # The dissolved boundary is only a constraint for CreateRandomPoints, so keep it in memory
+        dissolved_fc = "memory/dissolved_boundary"
         arcpy.management.Dissolve(boundary_fc_cleaned, dissolved_fc)
-        
-        if arcpy.Exists(random_fc_gdb):
-            arcpy.management.Delete(random_fc_gdb)
 
-        # Generate the same number of random points as there are anime stores
         arcpy.management.CreateRandomPoints(
             out_path=analysis_gdb,
             out_name=GDB_LAYERS["random_proj"], # Output name relies on the active workspace
             constraining_feature_class=dissolved_fc,
             number_of_points_or_field=n_anime 
         )
-    print(f"✅ Random points generated ({n_anime}).")
+        arcpy.management.Delete(dissolved_fc)
+    mark_created(random_fc_gdb)
+    logger.info(f"✅ Random points generated ({n_anime}).")
 
     # 3. Create Population Centroids
-    arcpy.management.FeatureToPoint(boundary_fc_cleaned, pop_centroids_fc, "INSIDE")
-    print("✅ Population centroids created.")
+    # One SearchCursor -> InsertCursor pass instead of a FeatureToPoint tool run.
+    # labelPoint is always inside its polygon, same as FeatureToPoint's "INSIDE" option.
+    delete_if_exists(pop_centroids_fc)
+    arcpy.management.CreateFeatureclass(
+        out_path=analysis_gdb,
+        out_name=GDB_LAYERS["pop_centroids"],
+        geometry_type="POINT",
+        spatial_reference=target_sr
+    )
+    arcpy.management.AddFields(pop_centroids_fc, [["ADM2_EN", "TEXT", "", 254], ["pop_dens", "DOUBLE"]])
+    with arcpy.da.SearchCursor(boundary_fc_cleaned, ["SHAPE@", "ADM2_EN", "pop_dens"]) as s_cur, \
+         arcpy.da.InsertCursor(pop_centroids_fc, ["SHAPE@XY", "ADM2_EN", "pop_dens"]) as ins_cur:
+        for shape, name, dens in s_cur:
+            inside_pt = shape.labelPoint
+            ins_cur.insertRow([(inside_pt.X, inside_pt.Y), name, dens])
+    mark_created(pop_centroids_fc)
+    logger.info("✅ Population centroids created.")
     
     return anime_fc_proj, random_fc_gdb, pop_centroids_fc
 
@@ -309,19 +598,38 @@ def run_proximity_analysis(anime_fc, random_fc, pop_fc, analysis_gdb, output_fol
     NEAR_LINES_ANIME = os.path.join(output_folder, f"{project_name}_near_lines_anime.shp")
     NEAR_LINES_RANDOM = os.path.join(output_folder, f"{project_name}_near_lines_random.shp")
 
-    # A. Anime Stores vs. Population Centroids
-    anime_near_table = os.path.join(analysis_gdb, GDB_LAYERS["anime_near_table"])
-    run_near_table(anime_fc, pop_fc, anime_near_table)
-    near_table_to_lines(anime_near_table, anime_fc, pop_fc, NEAR_LINES_ANIME, TARGET_SR)
-
-    # B. Random Points vs. Population Centroids
-    random_near_table = os.path.join(analysis_gdb, GDB_LAYERS["random_near_table"])
-    run_near_table(random_fc, pop_fc, random_near_table)
-    near_table_to_lines(random_near_table, random_fc, pop_fc, NEAR_LINES_RANDOM, TARGET_SR)
-
-    # C. Extract and Compare Distances
-    anime_dist = near_distances_to_array(anime_near_table)
-    random_dist = near_distances_to_array(random_near_table)
+    if SCIPY_AVAILABLE and NEAR_METHOD == "PLANAR":
+        # One KD-tree over the centroids answers both point sets in memory: no near tables are
+        # written or read back, and the near lines come straight from the query results.
+        logger.info("Querying nearest population centroids (KD-tree)...")
+        _, pop_xy = point_oid_xy(pop_fc)
+        tree = cKDTree(pop_xy)
+
+        # A. Anime Stores vs. Population Centroids
+        anime_oids, anime_xy = point_oid_xy(anime_fc)
+        anime_dist, anime_idx = tree.query(anime_xy, k=1)
+        write_near_lines(anime_oids, anime_xy, pop_xy[anime_idx], NEAR_LINES_ANIME, TARGET_SR)
+
+        # B. Random Points vs. Population Centroids
+        random_oids, random_xy = point_oid_xy(random_fc)
+        random_dist, random_idx = tree.query(random_xy, k=1)
+        write_near_lines(random_oids, random_xy, pop_xy[random_idx], NEAR_LINES_RANDOM, TARGET_SR)
+    else:
+        # GEODESIC distances (or no SciPy): fall back to ArcGIS near tables
+        # Near tables are only read back within this run, so they live in memory/ instead of the GDB
+        # A. Anime Stores vs. Population Centroids
+        anime_near_table = f"memory/{GDB_LAYERS['anime_near_table']}"
+        run_near_table(anime_fc, pop_fc, anime_near_table)
+        near_table_to_lines(anime_near_table, anime_fc, pop_fc, NEAR_LINES_ANIME, TARGET_SR)
+
+        # B. Random Points vs. Population Centroids
+        random_near_table = f"memory/{GDB_LAYERS['random_near_table']}"
+        run_near_table(random_fc, pop_fc, random_near_table)
+        near_table_to_lines(random_near_table, random_fc, pop_fc, NEAR_LINES_RANDOM, TARGET_SR)
+
+        # C. Extract Distances
+        anime_dist = near_distances_to_array(anime_near_table)
+        random_dist = near_distances_to_array(random_near_table)
 
     # Calculate descriptive statistics
     mean_anime = np.mean(anime_dist)
@@ -333,10 +641,13 @@ def run_proximity_analysis(anime_fc, random_fc, pop_fc, analysis_gdb, output_fol
 
     t, p = None, None
     if SCIPY_AVAILABLE:
-        t, p = stats.ttest_ind(
-            anime_dist, random_dist,
-            equal_var=False, nan_policy='omit'
-        )
+        # Welch's t-test in closed form from the variances above (distances are always finite,
+        # so no NaN screening); only the Student-t tail probability comes from SciPy
+        var_mean_anime = sd_anime ** 2 / len(anime_dist)
+        var_mean_random = sd_random ** 2 / len(random_dist)
+        t = float((mean_anime - mean_random) / np.sqrt(var_mean_anime + var_mean_random))
+        dof = (var_mean_anime + var_mean_random) ** 2 / (var_mean_anime ** 2 / (len(anime_dist) - 1) + var_mean_random ** 2 / (len(random_dist) - 1))
+        p = float(2 * stdtr(dof, -abs(t)))
 
     # D. Output CSV
     with open(RESULTS_CSV, "w", newline="", encoding="utf-8") as f:
@@ -344,11 +655,11 @@ def run_proximity_analysis(anime_fc, random_fc, pop_fc, analysis_gdb, output_fol
         writer.writerow(["metric", "anime_mean", "random_mean", "anime_median", "random_median", "anime_std", "random_std", "t_stat", "p_value", "city"])
         writer.writerow(["distance_to_population", mean_anime, mean_random, med_anime, med_random, sd_anime, sd_random, t, p, project_name])
     
-    print(f"\n📊 Results saved: {RESULTS_CSV}")
-    print(f"\n📊 Distance-to-Population Statistics for {project_name}:")
-    print(f"Anime stores: Mean={mean_anime:.2f}m, Median={med_anime:.2f}m")
+    logger.info(f"\n📊 Results saved: {RESULTS_CSV}")
+    logger.info(f"\n📊 Distance-to-Population Statistics for {project_name}:")
+    logger.info(f"Anime stores: Mean={mean_anime:.2f}m, Median={med_anime:.2f}m")
     if t is not None:
-        print(f"Welch t-test: t_stat={t:.3f}, p_value={p:.4f}")
+        logger.info(f"Welch t-test: t_stat={t:.3f}, p_value={p:.4f}")
 
 # -----------------------------------------------------
 # STEP 6 — Spatial Clustering Analysis (Moran's I / Gi*)
@@ -363,33 +674,55 @@ def run_clustering_analysis(boundary_fc_cleaned, anime_fc, analysis_gdb):
     # B. Hot Spot Analysis (Gi*) for Anime Stores
     anime_count_fc = os.path.join(analysis_gdb, GDB_LAYERS["anime_count"])
     hotspot_output = os.path.join(analysis_gdb, GDB_LAYERS["hotspot_anime"])
+    band_m = 1500 # Fixed distance band (meters)
+
+    # The in-process path measures the band as planar distance between centroids, so it needs a projected
+    # TARGET_SR (same gate as the KD-tree near step); HotSpots handles the band units itself otherwise
+    if PYSAL_AVAILABLE and SHAPELY_AVAILABLE and SCIPY_AVAILABLE and NEAR_METHOD == "PLANAR":
+        # Count + Gi* in memory and write the result fields once (no SummarizeWithin output, no HotSpots run)
+        gi_star_hotspots(boundary_fc_cleaned, anime_fc, hotspot_output, band_m)
+    else:
+        # i. Aggregate points to polygons (Count stores per municipal area)
+        delete_if_exists(anime_count_fc)
+
+        arcpy.analysis.SummarizeWithin(
+            in_polygons=boundary_fc_cleaned,
+            in_sum_features=anime_fc,
+            out_feature_class=anime_count_fc,
+            keep_all_polygons=True 
+        )
+        mark_created(anime_count_fc)
+
+        # ii. Run Gi* Hot Spot Analysis on the aggregated counts
+        arcpy.stats.HotSpots(
+            Input_Feature_Class=anime_count_fc,
+            Output_Feature_Class=hotspot_output,
+            Input_Field="POINT_COUNT",
+            Conceptualization_of_Spatial_Relationships="FIXED_DISTANCE_BAND",
+            Distance_Band_or_Threshold_Distance=f"{band_m} Meters",
+            Standardization="ROW"
+        )
 
-    # i. Aggregate points to polygons (Count stores per municipal area)
-    if arcpy.Exists(anime_count_fc):
-        arcpy.management.Delete(anime_count_fc)
-
-    arcpy.analysis.SummarizeWithin(
-        in_polygons=boundary_fc_cleaned,
-        in_sum_features=anime_fc,
-        out_feature_class=anime_count_fc,
-        keep_all_polygons=True 
-    )
-
-    # ii. Run Gi* Hot Spot Analysis on the aggregated counts
-    arcpy.stats.HotSpots(
-        Input_Feature_Class=anime_count_fc,
-        Output_Feature_Class=hotspot_output,
-        Input_Field="POINT_COUNT",
-        Conceptualization_of_Spatial_Relationships="FIXED_DISTANCE_BAND",
-        Distance_Band_or_Threshold_Distance="1500 Meters",
-        Standardization="ROW"
-    )
-
-    print(f"🔥 Anime Store Hot Spot layer created: {hotspot_output}")
+    logger.info(f"🔥 Anime Store Hot Spot layer created: {hotspot_output}")
 
 # =====================================================
 # Core Batch Execution Function (The Loop Logic)
 # =====================================================
+def project_gdb_path(project_folder):
+    """Returns the city's analysis GDB path: <project>/output/<project>_analysis.gdb."""
+    project_name = os.path.basename(project_folder)
+    return os.path.join(project_folder, "output", f"{project_name}_analysis.gdb")
+
+def create_missing_gdbs(project_folders):
+    """Creates every city's output folder and analysis GDB once, up front, before any city (or worker) starts."""
+    for project_folder in project_folders:
+        if not os.path.exists(os.path.join(project_folder, "inputs")):
+            continue # run_analysis_for_project reports and skips this city
+        gdb_path = project_gdb_path(project_folder)
+        if not os.path.isdir(gdb_path): # A file GDB is a folder, so one stat() instead of a catalog lookup
+            os.makedirs(os.path.dirname(gdb_path), exist_ok=True)
+            arcpy.management.CreateFileGDB(os.path.dirname(gdb_path), os.path.basename(gdb_path))
+
 def run_analysis_for_project(project_folder):
     """
     Runs the full analysis pipeline for a single defined project folder (city).
@@ -399,9 +732,9 @@ def run_analysis_for_project(project_folder):
     """
 
     project_name = os.path.basename(project_folder) # Extract the city name (e.g., 'Tokyo') from the path.
-    print("\n" + "="*80)
-    print(f"🚀 STARTING ANALYSIS FOR: {project_name}")
-    print("="*80)
+    logger.info("\n" + "="*80)
+    logger.info(f"🚀 STARTING ANALYSIS FOR: {project_name}")
+    logger.info("="*80)
 
     # --- Dynamic Path Configuration for the current project ---
     INPUT_FOLDER = os.path.join(project_folder, "inputs")  # Define the city-specific input path.
@@ -409,21 +742,23 @@ def run_analysis_for_project(project_folder):
 
     # Validate structure
     if not os.path.exists(INPUT_FOLDER):
-        print(f"❌ Skipping: Missing 'inputs' folder for {project_name}.") # Cannot proceed without inputs.
+        logger.error(f"❌ Skipping: Missing 'inputs' folder for {project_name}.") # Cannot proceed without inputs.
         return # Exit this function instance, allowing the main loop to continue to the next city.
 
-    # Ensure output structure exists
-    if not os.path.exists(OUTPUT_FOLDER):
-        os.makedirs(OUTPUT_FOLDER) # Create the 'output' folder if it doesn't exist.
-
-    # Create dynamic GDB name
-    ANALYSIS_GDB = os.path.join(OUTPUT_FOLDER, f"{project_name}_analysis.gdb")
-    if not arcpy.Exists(ANALYSIS_GDB):
-        arcpy.management.CreateFileGDB(OUTPUT_FOLDER, f"{project_name}_analysis.gdb") # Create a unique GDB for this city.
+    # Dynamic GDB name (the output folder and GDB are created by main() before the batch starts)
+    ANALYSIS_GDB = project_gdb_path(project_folder)
 
     # **SCENARIO 1 KEY ACTION: Reset the workspace for the current project GDB**
     arcpy.env.workspace = ANALYSIS_GDB # CRITICAL: Sets the ArcPy environment so all tools use this GDB as the default output location.
-    print(f"Workspace set to {ANALYSIS_GDB}")
+    arcpy.env.outputCoordinateSystem = TARGET_SR # Tool outputs (including the population raster) are written in TARGET_SR
+
+    # Raster environment: use every core the raster tools support. Pyramids + statistics stay on:
+    # the only raster written here is the delivered POP_RASTER, not an intermediate
+    arcpy.env.parallelProcessingFactor = "100%"
+    arcpy.env.compression = "LZ77"
+    arcpy.env.tileSize = "256 256"
+    logger.info(f"Workspace set to {ANALYSIS_GDB}")
+    refresh_gdb_catalog() # One catalog listing for this city; the helpers check against it instead of arcpy.Exists
 
     try:
         # STEP 3: Data Prep
@@ -442,15 +777,18 @@ def run_analysis_for_project(project_folder):
         # Calls the function to run LISA (pop density) and Gi* Hot Spot (store counts).
         run_clustering_analysis(cleaned_boundary, anime_fc_proj, ANALYSIS_GDB)
 
-        print(f"\n\n✅ ANALYSIS COMPLETE FOR: {project_name}")
+        logger.info(f"\n\n✅ ANALYSIS COMPLETE FOR: {project_name}")
 
     except Exception as e:
         # Error Containment: If any step (3, 4, 5, or 6) fails, this block catches it.
-        print(f"\n🚨 ERROR IN {project_name}! Analysis failed.")
-        print("Details:", e)
-        traceback.print_exc() # Prints the full error stack for debugging.
+        logger.error(f"\n🚨 ERROR IN {project_name}! Analysis failed.")
+        logger.exception(f"Details: {e}") # Logs the message plus the full error stack for debugging.
         # Crucially, the function ends here, and the main loop continues to the next city.
 
+    finally:
+        # Free the memory/ workspace (near tables, XY line tables) before the next city
+        arcpy.management.Delete("memory")
+
 # =====================================================
 # Main execution loop (The Orchestrator)
 # =====================================================
@@ -460,11 +798,28 @@ def main():
     overall list of tasks and call the processing function for each one.
     """
     if not PROJECT_FOLDERS_TO_PROCESS:
-        print("No project folders found to process. Check BASE_PROJECT_DIR path.")
+        logger.error("No project folders found to process. Check BASE_PROJECT_DIR path.")
         sys.exit(1) # Stop script if the initial project discovery failed.
 
-    for project_folder in PROJECT_FOLDERS_TO_PROCESS: # Loop through every city folder discovered earlier.
-        run_analysis_for_project(project_folder) # Delegates the work to the dedicated processing function.
+    create_missing_gdbs(PROJECT_FOLDERS_TO_PROCESS) # One setup pass, so the per-city path only sets its workspace
+
+    if MAX_WORKERS <= 1:
+        for project_folder in PROJECT_FOLDERS_TO_PROCESS: # Loop through every city folder discovered earlier.
+            run_analysis_for_project(project_folder) # Delegates the work to the dedicated processing function.
+        return
+
+    # One worker process per city (up to the core count). Each worker re-imports this module,
+    # so TARGET_SR / GDB_LAYERS are rebuilt there and every worker gets its own arcpy.env.
+    # Worker log records come back through log_queue, so only this process writes the log file.
+    logger.info(f"Running {len(PROJECT_FOLDERS_TO_PROCESS)} cities across {MAX_WORKERS} worker processes...")
+    with ProcessPoolExecutor(max_workers=MAX_WORKERS, initializer=init_worker_logging, initargs=(log_queue,)) as executor:
+        futures = {executor.submit(run_analysis_for_project, p): p for p in PROJECT_FOLDERS_TO_PROCESS}
+        for future in as_completed(futures): # Report each city as soon as it finishes
+            try:
+                future.result()
+            except Exception as e:
+                # Step-level errors are already contained per city; this catches setup failures (e.g. GDB creation)
+                logger.error(f"🚨 Worker for {os.path.basename(futures[future])} failed: {e}")
 
 if __name__ == "__main__":
     # The entry point: executes the main function when the script is run directly.
@@ -1,7 +1,18 @@
 import arcpy
 import os
+import pickle
+import numpy as np
 from arcpy.sa import *
 
+# GDAL (ships with ArcGIS Pro's Python) lets steps 2-4 run as one warp instead of three tools
+try:
+    from osgeo import gdal
+    gdal.UseExceptions()
+    GDAL_AVAILABLE = True
+except ImportError:
+    gdal = None
+    GDAL_AVAILABLE = False
+
 # =========================================================================
 # USER CONFIGURATION: PLUG YOUR PATHS HERE
 # =========================================================================
@@ -15,62 +26,153 @@ output_crs = arcpy.SpatialReference(3359) # NAD 1983 StatePlane NC Meters
 elevation_threshold = 120 
 # =========================================================================
 
+# TILE LIST CACHE: the sorted tile paths are pickled next to the outputs and reused
+# until the input folder's modification time changes (a tile added, removed or renamed).
+tile_cache_file = os.path.join(output_workspace, "tile_list_cache.pkl")
+
+def list_tiles(folder, cache_file):
+    folder_mtime = os.path.getmtime(folder)
+    try:
+        with open(cache_file, "rb") as f:
+            cached_folder, cached_mtime, cached_tiles = pickle.load(f)
+        if cached_folder == folder and cached_mtime == folder_mtime:
+            return cached_tiles
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+        pass # No usable cache yet, fall through to a fresh scan
+
+    # os.scandir returns the entry type with the listing, so no extra stat() per file
+    with os.scandir(folder) as entries:
+        tiles = sorted(e.path for e in entries if e.is_file() and e.name.endswith(".tif"))
+
+    try:
+        with open(cache_file, "wb") as f:
+            pickle.dump((folder, folder_mtime, tiles), f)
+    except OSError:
+        pass # Caching is best-effort; an unwritable output folder should not stop the run
+    return tiles
+
+# GDAL SRS string: the EPSG code when there is one, otherwise the full WKT
+# (a custom or unknown spatial reference has factoryCode 0, and "EPSG:0" makes gdal.Warp fail)
+def gdal_srs(spatial_ref):
+    if spatial_ref.factoryCode:
+        return f"EPSG:{spatial_ref.factoryCode}"
+    return spatial_ref.exportToString()
+
 # Environment Settings
 arcpy.env.overwriteOutput = True
+arcpy.env.parallelProcessingFactor = "100%" # Mosaic/Project/Clip fallback uses every core
 arcpy.CheckOutExtension("Spatial")
 
 try:
     # 1. AUTOMATED TILE DISCOVERY
     print("Step 1: Discovering tiles...")
-    tile_list = [os.path.join(input_folder, f) for f in os.listdir(input_folder) if f.endswith(".tif")]
+    tile_list = list_tiles(input_folder, tile_cache_file)
     print(f"Found {len(tile_list)} tiles.")
 
-    # 2. MOSAICING (Keeping Native Units)
-    print("Step 2: Mosaicking tiles into seamless sheet...")
-    raw_mosaic = os.path.join(output_workspace, "temp_raw_mosaic.tif")
-    arcpy.management.MosaicToNewRaster(
-        input_rasters=tile_list,
-        output_location=output_workspace,
-        raster_dataset_name_with_extension="temp_raw_mosaic.tif",
-        coordinate_system_for_the_raster="#",
-        pixel_type="16_BIT_SIGNED",
-        number_of_bands=1,
-        mosaic_method="FIRST"
-    )
-
-    # 3. PROJECTING (Sphere to Flat Map)
-    print("Step 3: Warping data from Degrees to Meters...")
-    projected_raster = os.path.join(output_workspace, "srtm_projected_meters.tif")
-    arcpy.management.ProjectRaster(
-        in_raster=raw_mosaic,
-        out_raster=projected_raster,
-        out_coor_system=output_crs,
-        resampling_type="BILINEAR",
-        cell_size="30"
-    )
-
-    # 4. PRECISION CLIPPING (The Shape-Based Cut)
-    print("Step 4: Clipping to irregular polygon boundary...")
     final_dem = os.path.join(output_workspace, "Wake_DEM_Final_Clipped.tif")
-    arcpy.management.Clip(
-        in_raster=projected_raster, 
-        out_raster=final_dem, 
-        in_template_dataset=in_clip_feature,
-        nodata_value="-9999",
-        clipping_geometry="ClippingGeometry", 
-        maintain_clipping_extent="NO_MAINTAIN_EXTENT" 
-    )
+
+    if GDAL_AVAILABLE:
+        # 2-4. MOSAIC + PROJECT + CLIP in a single multithreaded pass (no temp mosaic or projected copy)
+        print("Steps 2-4: Mosaicking, warping to meters and clipping in one gdal.Warp pass...")
+        gdal.Warp(
+            final_dem,
+            tile_list[::-1], # Later sources overwrite earlier ones, so reverse to match mosaic_method="FIRST"
+            dstSRS=gdal_srs(output_crs),
+            xRes=30,
+            yRes=30,
+            resampleAlg="bilinear",
+            cutlineDSName=in_clip_feature,
+            cropToCutline=True,
+            dstNodata=-9999,
+            multithread=True,
+            warpOptions=["NUM_THREADS=ALL_CPUS"],
+            warpMemoryLimit=2048,
+            creationOptions=["TILED=YES", "COMPRESS=DEFLATE", "BIGTIFF=IF_SAFER"]
+        )
+    else:
+        # The temp mosaic and projected copy are only read by the next step, so skip their pyramids + stats.
+        # Restored before step 4 so the final DEM (and the analysis raster) still get them.
+        previous_pyramid, previous_stats = arcpy.env.pyramid, arcpy.env.rasterStatistics
+        arcpy.env.pyramid = "NONE"
+        arcpy.env.rasterStatistics = "NONE"
+
+        # 2. MOSAICING (Keeping Native Units)
+        print("Step 2: Mosaicking tiles into seamless sheet...")
+        raw_mosaic = os.path.join(output_workspace, "temp_raw_mosaic.tif")
+        arcpy.management.MosaicToNewRaster(
+            input_rasters=tile_list,
+            output_location=output_workspace,
+            raster_dataset_name_with_extension="temp_raw_mosaic.tif",
+            coordinate_system_for_the_raster="#",
+            pixel_type="16_BIT_SIGNED",
+            number_of_bands=1,
+            mosaic_method="FIRST"
+        )
+
+        # 3. PROJECTING (Sphere to Flat Map)
+        print("Step 3: Warping data from Degrees to Meters...")
+        projected_raster = os.path.join(output_workspace, "srtm_projected_meters.tif")
+        arcpy.management.ProjectRaster(
+            in_raster=raw_mosaic,
+            out_raster=projected_raster,
+            out_coor_system=output_crs,
+            resampling_type="BILINEAR",
+            cell_size="30"
+        )
+        arcpy.env.pyramid, arcpy.env.rasterStatistics = previous_pyramid, previous_stats
+
+        # 4. PRECISION CLIPPING (The Shape-Based Cut)
+        print("Step 4: Clipping to irregular polygon boundary...")
+        arcpy.management.Clip(
+            in_raster=projected_raster, 
+            out_raster=final_dem, 
+            in_template_dataset=in_clip_feature,
+            nodata_value="-9999",
+            clipping_geometry="ClippingGeometry", 
+            maintain_clipping_extent="NO_MAINTAIN_EXTENT" 
+        )
 
     # 5. MAP ALGEBRA ANALYSIS (Identify High Ground)
-    # Using the Raster() class from Lesson 1.6.3
     print(f"Step 5: Identifying terrain above {elevation_threshold}m...")
-    
-    # This single line of math creates the analysis
-    high_ground_bool = Raster(final_dem) > elevation_threshold
-    
-    # Save the analysis result permanently to disk
     analysis_output = os.path.join(output_workspace, "Wake_High_Ground_Analysis.tif")
-    high_ground_bool.save(analysis_output)
+
+    if GDAL_AVAILABLE:
+        # Same 1/0 result as Raster(final_dem) > threshold, computed block by block with NumPy
+        # and written as 8-bit (255 = NoData) instead of a full-resolution Spatial Analyst raster
+        src = gdal.Open(final_dem)
+        band = src.GetRasterBand(1)
+        nodata = band.GetNoDataValue()
+        x_size, y_size = src.RasterXSize, src.RasterYSize
+
+        out_ds = gdal.GetDriverByName("GTiff").Create(
+            analysis_output, x_size, y_size, 1, gdal.GDT_Byte, ["TILED=YES", "COMPRESS=DEFLATE"]
+        )
+        out_ds.SetGeoTransform(src.GetGeoTransform())
+        out_ds.SetProjection(src.GetProjection())
+        out_band = out_ds.GetRasterBand(1)
+        out_band.SetNoDataValue(255)
+
+        block_x, block_y = band.GetBlockSize()
+        for y_off in range(0, y_size, block_y):
+            rows = min(block_y, y_size - y_off)
+            for x_off in range(0, x_size, block_x):
+                cols = min(block_x, x_size - x_off)
+                elev = band.ReadAsArray(x_off, y_off, cols, rows)
+                high_ground = (elev > elevation_threshold).astype(np.uint8)
+                if nodata is not None:
+                    high_ground[elev == nodata] = 255
+                out_band.WriteArray(high_ground, x_off, y_off)
+
+        out_band.FlushCache()
+        out_ds = None # Closing the datasets finishes writing the file
+        src = None
+    else:
+        # Using the Raster() class from Lesson 1.6.3
+        # This single line of math creates the analysis
+        high_ground_bool = Raster(final_dem) > elevation_threshold
+        
+        # Save the analysis result permanently to disk
+        high_ground_bool.save(analysis_output)
 
     print(f"--- SUCCESS ---")
     print(f"Final DEM: {final_dem}")
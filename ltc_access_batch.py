@@ -5,7 +5,10 @@ import numpy as np
 import csv
 import traceback
 import tempfile
+import shutil
+import ctypes
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # --- Scipy Check for Statistical Tests ---
 # Kept for future use in the Comparative Analysis (e.g., comparing ward averages)
@@ -49,6 +52,12 @@ PROJECT_FOLDERS_TO_PROCESS = [os.path.join(BASE_PROJECT_DIR, name) for name in s
 
 print(f"Projects queued: {selected_projects}")
 
+# --- PARALLEL CONFIGURATION ---
+# Each city has its own inputs and its own GDB, so cities can run in separate processes.
+# Half the cores, since each process also holds an ArcGIS license and mostly waits on disk.
+# Set to 1 to process the cities one after another in this process.
+MAX_WORKERS = min(len(PROJECT_FOLDERS_TO_PROCESS), max(1, (os.cpu_count() or 2) // 2))
+
 # Define Target CRS: JGD2011 / UTM Zone 54N (WKID 6697)
 TARGET_SR = arcpy.SpatialReference(6697)
 
@@ -72,6 +81,60 @@ def check_exists_layer(path, datatype="Feature Class"):
 
 # (near_distances_to_array, near_table_to_lines, run_near_table, run_lisa removed as they are not needed for the Descriptive Analysis section)
 
+def project_if_needed(src, dst, sr):
+    """Writes src to dst in sr: a plain copy when src already has the same WKID, otherwise a Project."""
+    src_code = arcpy.Describe(src).spatialReference.factoryCode
+    if src_code == sr.factoryCode and src_code != 0: # 0 is a custom SR with no WKID, so always project it
+        arcpy.management.CopyFeatures(src, dst)
+    else:
+        arcpy.management.Project(src, dst, sr)
+    return dst
+
+def find_column(column_index, name):
+    """Returns the CSV column called `name`, or failing that the first column containing it (e.g. a prefixed export)."""
+    if name in column_index:
+        return name
+    return next((n for n in column_index if name in n and "ADM2_EN" not in n), None)
+
+def load_elderly_csv(csv_path):
+    """Reads ADM2_EN plus the POP_TOTAL / POP_65PLUS columns from the CSV and computes ELD_PCT per ward.
+
+    Returns (structured array, total field name, 65+ field name); the field names are None if a column is missing.
+    Raises ValueError if the ADM2_EN key column is missing.
+    Rows with a non-numeric count are skipped, so those wards end up unmatched (null ELD_PCT).
+    """
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        column_index = {name: i for i, name in enumerate(header)} # One pass over the header; lookups below are O(1)
+        if "ADM2_EN" not in column_index: # Join key, matched by exact name against the ward boundary
+            raise ValueError(f"Could not find the 'ADM2_EN' column in {csv_path}.")
+        pop_total_field = find_column(column_index, "POP_TOTAL")
+        pop_65plus_field = find_column(column_index, "POP_65PLUS")
+        if pop_total_field is None or pop_65plus_field is None:
+            return None, pop_total_field, pop_65plus_field
+
+        key_i, total_i, plus_i = column_index["ADM2_EN"], column_index[pop_total_field], column_index[pop_65plus_field]
+        keys, totals, plus65 = [], [], []
+        for row in reader:
+            try:
+                total, p65 = float(row[total_i]), float(row[plus_i])
+            except (IndexError, ValueError):
+                continue
+            keys.append(row[key_i])
+            totals.append(total)
+            plus65.append(p65)
+
+    width = max((len(k) for k in keys), default=1)
+    arr = np.empty(len(keys), dtype=[("ADM2_EN", f"U{width}"), (pop_total_field, "f8"), (pop_65plus_field, "f8"), ("ELD_PCT", "f8")])
+    arr["ADM2_EN"] = keys
+    arr[pop_total_field] = totals
+    arr[pop_65plus_field] = plus65
+    # Calculate Percentage Elderly: (POP_65PLUS / POP_TOTAL) * 100
+    # Add a small buffer (+1) to the denominator to prevent division by zero in case of empty polygons, although unlikely for wards.
+    arr["ELD_PCT"] = arr[pop_65plus_field] / (arr[pop_total_field] + 1) * 100
+    return arr, pop_total_field, pop_65plus_field
+
 # =====================================================
 # DYNAMIC FUNCTION BLOCK (Receives city-specific paths)
 # =====================================================
@@ -88,69 +151,37 @@ def prepare_population_data(input_folder, output_folder, project_name, analysis_
     BOUNDARY_FC_RAW = os.path.join(input_folder, "MunicipalBoundaries.shp") # Ward Polygons
     POPULATION_CSV = os.path.join(input_folder, "ElderlyPopulationData.csv") # Must contain ADM2_EN, POP_TOTAL, and POP_65PLUS
     
-    # --- INTERMEDIATE/OUTPUT PATHS (In the current city's GDB) ---
-    boundary_projected = os.path.join(analysis_gdb, f"{project_name}_WardBoundaries_UTM_Intermediate")
-    boundary_joined_w_pop = os.path.join(analysis_gdb, f"{project_name}_WardBoundaries_Joined_Intermediate")
+    # --- INTERMEDIATE PATHS (memory workspace: only read by the next tools in this run) ---
+    boundary_projected = f"memory/{project_name}_WardBoundaries_UTM_Intermediate"
+
+    # --- OUTPUT PATHS (In the current city's GDB) ---
     final_ward_data = os.path.join(analysis_gdb, GDB_LAYERS["analysis_data"])
 
     # 1. Project raw boundary
-    arcpy.management.Project(BOUNDARY_FC_RAW, boundary_projected, target_sr)
+    project_if_needed(BOUNDARY_FC_RAW, boundary_projected, target_sr)
     print("✅ Ward Boundary projected.")
 
-    # 2. Join Elderly Population CSV 
+    # 2. Read the Elderly Population CSV and calculate percentage of elderly population (% Aged 65+)
     # NOTE: CSV must have fields for Total Population (POP_TOTAL) and Population 65+ (POP_65PLUS).
-    layer_name = f"{project_name}_boundary_lyr"
-    arcpy.management.MakeFeatureLayer(boundary_projected, layer_name)
-    arcpy.management.AddJoin(layer_name, "ADM2_EN", POPULATION_CSV, "ADM2_EN")
-    arcpy.management.CopyFeatures(layer_name, boundary_joined_w_pop)
-    arcpy.management.RemoveJoin(layer_name)
-    print(f"✅ Elderly Population CSV joined to boundary.")
+    # The CSV is parsed and ELD_PCT computed in memory, so no join layer or joined copy is written.
+    pop_arr, pop_total_field, pop_65plus_field = load_elderly_csv(POPULATION_CSV)
+    if pop_arr is None:
+        raise Exception(f"Could not find 'POP_TOTAL' and 'POP_65PLUS' columns in {POPULATION_CSV} for {project_name}.")
 
-    # 3. Add density field and calculate percentage of elderly population
-    arcpy.management.AddField(boundary_joined_w_pop, "ELD_PCT", "DOUBLE")
-    
-    # --- Dynamic Field Discovery for Population Counts ---
-    # Find the fields for the total population and the 65+ population after the join.
-    pop_total_field = None
-    pop_65plus_field = None
-    all_fields = arcpy.ListFields(boundary_joined_w_pop) 
-    
-    for field in all_fields:
-        # We assume the fields contain 'POP_TOTAL' and 'POP_65PLUS' and are numeric.
-        if (field.type in ('Float', 'Double', 'Integer', 'SmallInteger')) and (not "ADM2_EN" in field.name):
-            if "POP_TOTAL" in field.name:
-                pop_total_field = field.name
-            elif "POP_65PLUS" in field.name:
-                pop_65plus_field = field.name
-            
-    if pop_total_field is None or pop_65plus_field is None:
-        found_names = [f.name for f in all_fields]
-        raise Exception(f"Could not find numeric 'POP_TOTAL' and 'POP_65PLUS' fields in {project_name}. Fields found: {found_names}")
-        
     print(f"ℹ️ Discovered Total Pop Field: {pop_total_field}, 65+ Pop Field: {pop_65plus_field}")
-
-    # Calculate Percentage Elderly: (POP_65PLUS / POP_TOTAL) * 100
-    # Add a small buffer (+1) to the denominator to prevent division by zero in case of empty polygons, although unlikely for wards.
-    expression = f"(!{pop_65plus_field}! / (!{pop_total_field}! + 1)) * 100"
-    
-    arcpy.management.CalculateField(
-        in_table=boundary_joined_w_pop, 
-        field="ELD_PCT", 
-        expression=expression, 
-        expression_type="PYTHON3"
-    )
     print("🧮 Elderly population percentage (ELD_PCT) calculated.")
 
+    # 3. Join population counts + ELD_PCT onto the wards in place (unmatched wards get a null ELD_PCT)
+    arcpy.da.ExtendTable(boundary_projected, "ADM2_EN", pop_arr, "ADM2_EN", append_only=False)
+    print(f"✅ Elderly Population CSV joined to boundary.")
+
     # 4. Clean bad/missing data and save final municipal layer
-    arcpy.management.CopyFeatures(boundary_joined_w_pop, final_ward_data)
-    
     # Optional: Clean any rows where ELD_PCT is null or 0 (shouldn't happen with wards but good practice)
-    bad_rows_deleted = 0
-    with arcpy.da.UpdateCursor(final_ward_data, ["ELD_PCT"]) as cursor:
-        for row in cursor:
-            if row[0] is None or row[0] <= 0:
-                cursor.deleteRow()
-                bad_rows_deleted += 1
+    # The filter rides on the copy itself, so bad rows are never written and need no delete pass.
+    arcpy.conversion.ExportFeatures(boundary_projected, final_ward_data, where_clause="ELD_PCT > 0")
+    bad_rows_deleted = (int(arcpy.management.GetCount(boundary_projected).getOutput(0))
+                        - int(arcpy.management.GetCount(final_ward_data).getOutput(0)))
+    arcpy.management.Delete(boundary_projected) # Release the intermediate's RAM
     print(f"✅ Deleted {bad_rows_deleted} bad polygons. Cleaned data ready.")
     
     return final_ward_data # Return the path to the final polygon layer for FIGURE 7 & 8
@@ -158,8 +189,8 @@ def prepare_population_data(input_folder, output_folder, project_name, analysis_
 # -----------------------------------------------------
 # STEP 4 — Facility Data Setup (FIGURE 6)
 # -----------------------------------------------------
-def setup_facility_data(input_folder, analysis_gdb, target_sr):
-    """Projects Long-Term Care Facility point data."""
+def setup_facility_data(input_folder, output_folder, analysis_gdb, target_sr):
+    """Projects Long-Term Care Facility point data and caches the point coordinates as NumPy arrays."""
     print("\n[STEP 4] Setting up Long-Term Care Facility data...")
     
     # --- DYNAMIC INPUT ---
@@ -168,12 +199,21 @@ def setup_facility_data(input_folder, analysis_gdb, target_sr):
     # --- OUTPUT PATHS (In the current city's GDB) ---
     facility_fc_proj = os.path.join(analysis_gdb, GDB_LAYERS["facility_proj"])
 
+    # --- OUTPUT PATHS (Outside the GDB) ---
+    FACILITY_POINTS_NPZ = os.path.join(output_folder, "facility_points.npz")
+
     # 1. Project Facilities
-    arcpy.management.Project(FACILITY_FC_RAW, facility_fc_proj, target_sr)
-    n_facilities = int(arcpy.management.GetCount(facility_fc_proj).getOutput(0))
+    project_if_needed(FACILITY_FC_RAW, facility_fc_proj, target_sr)
+
+    # 2. Read OIDs + coordinates once as column arrays (the row count comes with them, no GetCount needed)
+    # Saved next to the GDB so later steps can np.load them and build e.g. a cKDTree without a cursor pass.
+    pts = arcpy.da.FeatureClassToNumPyArray(facility_fc_proj, ["OID@", "SHAPE@XY"])
+    n_facilities = len(pts)
     if n_facilities == 0:
         raise ValueError("Long-Term Care Facility layer is empty after projection.")
     print(f"✅ Facilities projected. Count: {n_facilities}")
+    np.savez(FACILITY_POINTS_NPZ, oid=pts["OID@"], x=pts["SHAPE@XY"][:, 0], y=pts["SHAPE@XY"][:, 1])
+    print(f"✅ Facility coordinates cached: {FACILITY_POINTS_NPZ}")
 
     # Note: No random points or centroids are needed for the descriptive maps, 
     # but the facility layer (facility_fc_proj) is required for FIGURE 6 and FIGURE 8.
@@ -195,6 +235,8 @@ def run_placeholder_analysis(ward_data, facility_data, output_folder, project_na
     # 1. SummarizeWithin to count facilities per ward.
     # 2. Calculating the Location Quotient (LQ) of facilities vs. elderly population.
     # 3. Running a spatial regression (e.g., GWR) or Hot Spot analysis on the LQ score.
+    # Facility coordinates are already cached in output_folder/facility_points.npz (oid, x, y arrays)
+    # for nearest-facility queries with NumPy/SciPy instead of per-row arcpy calls.
     
     pass
 
@@ -202,6 +244,32 @@ def run_placeholder_analysis(ward_data, facility_data, output_folder, project_na
 # =====================================================
 # Core Batch Execution Function (The Loop Logic)
 # =====================================================
+def project_gdb_path(project_folder):
+    """Returns the city's analysis GDB path: <project>/output/<project>_analysis.gdb."""
+    project_name = os.path.basename(project_folder)
+    return os.path.join(project_folder, "output", f"{project_name}_analysis.gdb")
+
+def is_network_path(path):
+    """True for UNC paths (\\\\server\\share\\...) and mapped network drives (Z:\\), where every GDB metadata write is a network round trip."""
+    if path.startswith("\\\\") or path.startswith("//"):
+        return True
+    drive = os.path.splitdrive(os.path.abspath(path))[0]
+    if drive and os.name == "nt":
+        return ctypes.windll.kernel32.GetDriveTypeW(drive + "\\") == 4 # DRIVE_REMOTE
+    return False
+
+def create_missing_gdbs(project_folders):
+    """Creates every city's output folder and analysis GDB once, up front, before any city (or worker) starts."""
+    for project_folder in project_folders:
+        if not os.path.exists(os.path.join(project_folder, "inputs")):
+            continue # run_analysis_for_project reports and skips this city
+        gdb_path = project_gdb_path(project_folder)
+        os.makedirs(os.path.dirname(gdb_path), exist_ok=True)
+        if is_network_path(project_folder):
+            continue # Built in local scratch and copied into place at the end of the city's run
+        if not os.path.isdir(gdb_path): # A file GDB is a folder, so one stat() instead of a catalog lookup
+            arcpy.management.CreateFileGDB(os.path.dirname(gdb_path), os.path.basename(gdb_path))
+
 def run_analysis_for_project(project_folder):
     """Runs the full analysis pipeline for a single project folder (city)."""
 
@@ -218,27 +286,50 @@ def run_analysis_for_project(project_folder):
         print(f"❌ Skipping: Missing 'inputs' folder for {project_name}.")
         return
 
-    if not os.path.exists(OUTPUT_FOLDER):
-        os.makedirs(OUTPUT_FOLDER)
-
-    # Create dynamic GDB name
-    ANALYSIS_GDB = os.path.join(OUTPUT_FOLDER, f"{project_name}_analysis.gdb")
-    if not arcpy.Exists(ANALYSIS_GDB):
-        arcpy.management.CreateFileGDB(OUTPUT_FOLDER, f"{project_name}_analysis.gdb")
-
-    arcpy.env.workspace = ANALYSIS_GDB
-    print(f"Workspace set to {ANALYSIS_GDB}")
+    # Dynamic GDB name (main() creates the output folder up front, and the GDB too unless the folder is on the network)
+    ANALYSIS_GDB = project_gdb_path(project_folder)
+
+    # --- Local scratch for cities on a network share ---
+    # All GDB writes go to a temp GDB on the local disk; the finished GDB is copied back once at the end.
+    local_scratch = None
+    keep_scratch = False # Set while finished results exist only in the local scratch GDB
+    work_gdb = ANALYSIS_GDB
+    previous_scratch = arcpy.env.scratchWorkspace # Restored in finally, so the next city in this process isn't left pointing at a deleted folder
+    if is_network_path(project_folder):
+        local_scratch = tempfile.mkdtemp(prefix=f"{project_name}_")
+        arcpy.env.scratchWorkspace = local_scratch
+        arcpy.management.CreateFileGDB(local_scratch, os.path.basename(ANALYSIS_GDB))
+        work_gdb = os.path.join(local_scratch, os.path.basename(ANALYSIS_GDB))
+        print(f"ℹ️ Network project folder: working in local scratch {local_scratch}")
+
+    arcpy.env.workspace = work_gdb
+    print(f"Workspace set to {work_gdb}")
 
     try:
         # STEP 3: Data Prep (Calculates ELD_PCT for FIGURE 7)
-        ward_data = prepare_population_data(INPUT_FOLDER, OUTPUT_FOLDER, project_name, ANALYSIS_GDB, TARGET_SR)
+        ward_data = prepare_population_data(INPUT_FOLDER, OUTPUT_FOLDER, project_name, work_gdb, TARGET_SR)
 
         # STEP 4: Facility Setup (Projects points for FIGURE 6 and FIGURE 8)
-        facility_data = setup_facility_data(INPUT_FOLDER, ANALYSIS_GDB, TARGET_SR)
+        facility_data = setup_facility_data(INPUT_FOLDER, OUTPUT_FOLDER, work_gdb, TARGET_SR)
 
         # STEP 5: Placeholder for Advanced Analysis
         run_placeholder_analysis(ward_data, facility_data, OUTPUT_FOLDER, project_name)
 
+        if local_scratch:
+            # One bulk copy back to the share, under a temporary name first so a GDB from an earlier run
+            # is only replaced once the copy is complete. Any failure here leaves the local results in place.
+            keep_scratch = True
+            staging_gdb = os.path.join(OUTPUT_FOLDER, f"{project_name}_analysis_copying.gdb")
+            if os.path.isdir(staging_gdb):
+                arcpy.management.Delete(staging_gdb) # Leftover from an interrupted copy
+            arcpy.management.Copy(work_gdb, staging_gdb)
+            if os.path.isdir(ANALYSIS_GDB):
+                arcpy.management.Delete(ANALYSIS_GDB) # Raises (e.g. locked by Pro) instead of silently losing the run
+            arcpy.management.Rename(staging_gdb, ANALYSIS_GDB)
+            keep_scratch = False
+            ward_data = os.path.join(ANALYSIS_GDB, os.path.basename(ward_data))
+            facility_data = os.path.join(ANALYSIS_GDB, os.path.basename(facility_data))
+
         print(f"\n\n✅ DATA PREP COMPLETE FOR MAPPING: {project_name}")
         print("Data for map layers (Figures 6, 7, 8) available in:")
         print(f"  - Elderly Density Polygons (Figure 7): {ward_data} (ELD_PCT field)")
@@ -250,6 +341,16 @@ def run_analysis_for_project(project_folder):
         traceback.print_exc()
         sys.exit(1) # Stop script if core data prep fails
 
+    finally:
+        if local_scratch:
+            arcpy.env.workspace = ANALYSIS_GDB
+            arcpy.env.scratchWorkspace = previous_scratch
+            arcpy.management.ClearWorkspaceCache() # Release the temp GDB's locks before removing it
+            if keep_scratch:
+                print(f"⚠️ Copy back to {ANALYSIS_GDB} failed; results kept in {work_gdb}")
+            else:
+                shutil.rmtree(local_scratch, ignore_errors=True)
+
 # =====================================================
 # Main execution loop (The Orchestrator)
 # =====================================================
@@ -259,8 +360,28 @@ def main():
         print("No project folders found to process.")
         sys.exit(1)
 
-    for project_folder in PROJECT_FOLDERS_TO_PROCESS:
-        run_analysis_for_project(project_folder)
+    create_missing_gdbs(PROJECT_FOLDERS_TO_PROCESS) # One setup pass, so the per-city path only sets its workspace
+
+    if MAX_WORKERS <= 1:
+        for project_folder in PROJECT_FOLDERS_TO_PROCESS:
+            run_analysis_for_project(project_folder)
+        return
+
+    # One worker process per city; each re-imports this module and sets its own arcpy.env.workspace.
+    # A city that fails prep calls sys.exit(1): the cities still waiting in the queue are cancelled, and the
+    # script exits with code 1 once the cities already handed to a worker have finished (they can't be stopped mid-tool).
+    print(f"Running {len(PROJECT_FOLDERS_TO_PROCESS)} cities across {MAX_WORKERS} worker processes...")
+    with ProcessPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {executor.submit(run_analysis_for_project, p): p for p in PROJECT_FOLDERS_TO_PROCESS}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except SystemExit:
+                print(f"🛑 {os.path.basename(futures[future])} failed; cancelling the queued cities.")
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+            except Exception as e:
+                print(f"🚨 Worker for {os.path.basename(futures[future])} failed: {e}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
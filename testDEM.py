@@ -3,8 +3,19 @@
 #setting up path 
 import arcpy
 import os
+from functools import lru_cache
+
+#gdal ships with arcgis pro python, lets mosaic + clip + project run as one warp
+try:
+    from osgeo import gdal
+    gdal.UseExceptions()
+    GDAL_AVAILABLE = True
+except ImportError:
+    gdal = None
+    GDAL_AVAILABLE = False
 
 arcpy.env.overwriteOutput = True
+arcpy.env.parallelProcessingFactor = "100%" #mosaic/project use every core
     
     
 #makign diction so can sawp out the path for other counties.
@@ -23,7 +34,7 @@ config ={
 def setup_gdb(output_folder, gdb):
 
     gdb_path = os.path.join(output_folder, gdb)
-    if not arcpy.Exists(gdb_path):
+    if not os.path.isdir(gdb_path): #file gdb is a folder, plain stat is enough
         arcpy.CreateFileGDB_management(output_folder, gdb)
         print(f"GDB created: {gdb_path}")
     else:
@@ -33,10 +44,16 @@ def setup_gdb(output_folder, gdb):
 
 
 #Detecting tiles
+#cached on (folder, mtime) so repeat calls skip the scan until the folder changes
+@lru_cache(maxsize=None)
+def _scan_tiles(input_folder, folder_mtime):
+    with os.scandir(input_folder) as entries:
+        return tuple(sorted(e.path for e in entries if e.is_file() and e.name.endswith(".tif")))
+
 def detect_tiles(input_folder):
     try:
 
-        tileList = [os.path.join(input_folder, f) for f in os.listdir(input_folder) if f.endswith(".tif")]
+        tileList = list(_scan_tiles(input_folder, os.path.getmtime(input_folder)))
         print(f"Tiles detected: {[os.path.basename(t) for t in tileList]}")
 
     except Exception as e:
@@ -45,8 +62,18 @@ def detect_tiles(input_folder):
 
 
 
-def mosaic_tiles(tileList, gdb_path):
+#clip_feature: the mosaic is only built over the clip feature's extent (same as the extent Clip used to cut),
+#so there is no full-size mosaic to write and then read back for a separate Clip
+def mosaic_tiles(tileList, gdb_path, clip_feature=None):
+    previous_extent = arcpy.env.extent
+    previous_pyramid, previous_stats = arcpy.env.pyramid, arcpy.env.rasterStatistics
     try:
+        if clip_feature:
+            arcpy.env.extent = clip_feature
+        #the mosaic is usually an intermediate (projected next), so no pyramids or stats on it.
+        #restored below so the projected raster still gets them (Project_cliped_mosaic adds stats if it's kept as-is)
+        arcpy.env.pyramid = "NONE"
+        arcpy.env.rasterStatistics = "NONE"
         mosaic_tiff = arcpy.management.MosaicToNewRaster(
             input_rasters = tileList,
             output_location= gdb_path,
@@ -59,24 +86,21 @@ def mosaic_tiles(tileList, gdb_path):
 
     except Exception as e:
         print(f"Error during processing: {e}  ")
+    finally:
+        arcpy.env.extent = previous_extent
+        arcpy.env.pyramid, arcpy.env.rasterStatistics = previous_pyramid, previous_stats
 
     return mosaic_tiff
 
-def Cliped_mosaic(mosaic_tiff, gdb_path, clip_feature):
-    try:
-        clipped_raster = arcpy.management.Clip(
-            in_raster= mosaic_tiff,
-            out_raster= os.path.join(gdb_path, "clipped_mosaic"),
-            in_template_dataset= clip_feature
-            
-            )
-
-    except Exception as e:
-        print(f"Error clipping mosaic: {e}")
-    return clipped_raster
-
 def Project_cliped_mosaic(Clipped_mosaic, gdb_path, crs):
 
+    #tiles already in the target crs: the clipped mosaic is the final raster, no full rewrite needed
+    src_code = arcpy.Describe(Clipped_mosaic).spatialReference.factoryCode
+    if src_code == crs.factoryCode and src_code != 0:
+        #mosaic was written without stats (intermediate), it's the delivered raster here so build them now
+        arcpy.management.CalculateStatistics(Clipped_mosaic)
+        return Clipped_mosaic
+
     projected_clipped_raster = arcpy.management.ProjectRaster(
         in_raster= Clipped_mosaic,
         out_raster=os.path.join(gdb_path, "projected_clipped_mosaic"),
@@ -87,6 +111,37 @@ def Project_cliped_mosaic(Clipped_mosaic, gdb_path, crs):
 
     
 
+#gdal wants an srs string: the EPSG code when there is one, otherwise the full WKT (custom/unknown crs has factoryCode 0)
+def gdal_srs(spatial_ref):
+    if spatial_ref.factoryCode:
+        return f"EPSG:{spatial_ref.factoryCode}"
+    return spatial_ref.exportToString()
+
+#one gdal.Warp pass: reads the tiles once and writes the clipped, projected dem once (no mosaic/clip intermediates)
+#clips to the boundary's extent like Clip did (no cutline mask), float32 + nearest neighbour like the arcpy steps
+def warp_tiles(tileList, output_folder, clip_feature, crs):
+    clip_desc = arcpy.Describe(clip_feature)
+    ext = clip_desc.extent
+    out_tif = os.path.join(output_folder, "projected_clipped_mosaic.tif")
+    try:
+        gdal.Warp(
+            out_tif,
+            tileList,
+            format="GTiff",
+            dstSRS=gdal_srs(crs),
+            outputBounds=(ext.XMin, ext.YMin, ext.XMax, ext.YMax),
+            outputBoundsSRS=gdal_srs(clip_desc.spatialReference),
+            outputType=gdal.GDT_Float32,
+            resampleAlg="near",
+            multithread=True,
+            warpOptions=["NUM_THREADS=ALL_CPUS"],
+            creationOptions=["TILED=YES", "COMPRESS=DEFLATE", "BIGTIFF=IF_SAFER"]
+        )
+    except Exception as e:
+        print(f"Error warping tiles: {e}")
+        return None #no usable output, main() stops instead of reporting a missing/partial file
+    return out_tif
+
 def main():
     
 
@@ -94,13 +149,17 @@ def main():
 
     tilesList = detect_tiles(config["input_folder"])
 
-    res_mosaic_tiles = mosaic_tiles(tilesList, gdb_path)
-
-    cliped_mosaic = Cliped_mosaic(res_mosaic_tiles, gdb_path, config["clip_feature"] )
+    if GDAL_AVAILABLE:
+        #mosaic + clip + project in a single warp, written as a geotiff next to the gdb
+        finalProjectedMosaic = warp_tiles(tilesList, config["output_folder"], config["clip_feature"], config["crs"])
+        if finalProjectedMosaic is None:
+            print("Processing failed: the warp did not produce an output DEM.")
+            return
+    else:
+        #mosaic + clip in one pass (mosaic is limited to the clip feature's extent)
+        cliped_mosaic = mosaic_tiles(tilesList, gdb_path, config["clip_feature"])
 
-    finalProjectedMosaic = os.path.join(gdb_path, "Final_Projected_clipped_mosaic")
-    
-    finalProjectedMosaic = Project_cliped_mosaic(cliped_mosaic, gdb_path, config["crs"])
+        finalProjectedMosaic = Project_cliped_mosaic(cliped_mosaic, gdb_path, config["crs"])
     
     print(f"Processing complete.{finalProjectedMosaic}")
 